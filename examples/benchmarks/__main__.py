@@ -0,0 +1,365 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Benchmark the estimators of the training notebooks, e.g. from the examples directory:
+#
+#   python -m benchmarks run --datasets Higgs Susy --models random_forest --repeats 5 --json results.json
+
+import sys
+import argparse
+import platform
+import os
+import statistics
+import pandas as pd
+from itertools import groupby
+
+from benchmarks.cases import select_cases, available
+from benchmarks.runner import run_case, add_speedups, write_results, limit_threads
+from benchmarks.scaling import thread_counts, pinned, strong_scaling, scaling_tables, plot_scaling
+from benchmarks.size import fractions, complexity, crossovers, plot_size_scaling
+from benchmarks.history import HistoryStore, fingerprint, compare, min_samples
+from benchmarks.inference import MAX_BATCH_SIZE, BASELINES, REQUIREMENTS, missing, batch_sizes, build_engines, predict_all
+from benchmarks.inference import measure_latency, latency_stats, add_inference_speedups, inference_tables
+from benchmarks.imports import time_import, import_profile
+
+def get_environment():
+    try:
+        import utils
+        return utils.get_environment()
+    except ImportError as e:
+        print("Warning: incomplete environment information (%s)" % (e))
+        return {'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+def open_dataset(name, cache_dir, synthetic=None):
+    # with `synthetic`, the synthetic stand-in of the dataset at that scale
+    import datasets
+    if synthetic is not None:
+        return getattr(datasets, 'Synthetic' + name)(cache_dir, scale=synthetic)
+    return getattr(datasets, name)(cache_dir)
+
+def load_dataset(name, cache_dir, fraction=None, mmap=False, synthetic=None):
+    return open_dataset(name, cache_dir, synthetic).get_train_test_split(mmap=mmap, fraction=fraction)
+
+def iter_runs(args, fraction=None, opened=None):
+    """
+    (case, library, data) for every selected case and installed library, loading each dataset once.
+
+    With `opened`, a dict kept across calls, subsets are taken from the memory-mapped full
+    split of each dataset, which is only opened on the first call, rather than loaded anew.
+    """
+
+    cases = select_cases(args.datasets, args.models)
+    if not cases:
+        raise SystemExit("No benchmark cases match the selection")
+    for dataset, group in groupby(sorted(cases, key=lambda case: case.dataset), key=lambda case: case.dataset):
+        print("Loading %s" % (dataset))
+        if opened is not None and fraction is not None:
+            if dataset not in opened:
+                ds = open_dataset(dataset, args.cache_dir, args.synthetic)
+                opened[dataset] = ds, ds.get_train_test_split(mmap=True)
+            ds, full = opened[dataset]
+            data = ds.subset(full, fraction)
+        else:
+            data = load_dataset(dataset, args.cache_dir, fraction, args.mmap, args.synthetic)
+        for case in group:
+            for library in case.libraries():
+                if args.libraries and library not in args.libraries:
+                    continue
+                if not available(library):
+                    print("Skipping %s for %s: %s is not installed" % (case.model, dataset, library))
+                    continue
+                yield case, library, data
+        del data
+
+MEMORY_COLUMNS = ['mem_rss_peak_increase', 'mem_rss_delta', 'mem_traced_peak_increase', 'mem_traced_delta']
+
+def print_summary(df):
+    columns = ['dataset', 'model', 'phase', 'library', 'n_jobs', 't_median', 't_ci_low', 't_ci_high',
+               't_p95', 'cpu_median', 'score', 'speed_up', 'significant']
+    df = df.copy()
+    for column in MEMORY_COLUMNS:
+        if column in df:
+            # in MiB
+            df[column[4:] + '_mb'] = df[column] / 1024**2
+            columns.append(column[4:] + '_mb')
+    with pd.option_context('display.max_rows', None, 'display.width', 250):
+        print(df[columns].to_string(index=False))
+
+def run(args):
+    rows = []
+    for case, library, (X_train, X_test, y_train, y_test) in iter_runs(args, args.fraction):
+        print("Benchmarking %s with %s (%d threads)" % (case.name, library, args.n_jobs))
+        rows.extend(run_case(case, library, X_train, X_test, y_train, y_test, args.n_jobs, args.warmup, args.repeats,
+                             args.memory, args.trace_memory))
+    df = add_speedups(pd.DataFrame(rows))
+    print_summary(df)
+    save(args, rows)
+    return 0
+
+def save(args, rows):
+    environment = get_environment()
+    write_results(rows, environment, args.json, args.csv)
+    if args.history:
+        filename = HistoryStore(args.history).add(environment, rows, args.command)
+        print("Added results to the history: %s" % (filename))
+
+def sweep(args):
+    counts = args.threads or thread_counts()
+    rows = []
+    for case, library, (X_train, X_test, y_train, y_test) in iter_runs(args, args.fraction):
+        for n_jobs in counts:
+            with pinned(n_jobs) as cpus:
+                print("Benchmarking %s with %s (%d threads, cpus %s)" % (case.name, library, n_jobs, cpus))
+                rows.extend(run_case(case, library, X_train, X_test, y_train, y_test, n_jobs, args.warmup, args.repeats,
+                                     args.memory, args.trace_memory))
+    df = strong_scaling(pd.DataFrame(rows))
+    for phase in ['fit', 'predict']:
+        speed_up, efficiency = scaling_tables(df, phase)
+        with pd.option_context('display.width', 200, 'display.float_format', '{:.2f}'.format):
+            print("\nStrong scaling of %s: speed-up over 1 thread\n%s" % (phase, speed_up))
+            print("\nStrong scaling of %s: parallel efficiency\n%s" % (phase, efficiency))
+        if args.plot_dir is not None:
+            for filename in plot_scaling(df, args.plot_dir, phase):
+                print("Wrote %s" % (filename))
+    rows = [dict(row, scaling_speed_up=s, efficiency=e) for row, s, e in zip(rows, df['scaling_speed_up'], df['efficiency'])]
+    save(args, rows)
+    return 0
+
+def size(args):
+    rows = []
+    # the full splits, memory-mapped, that the subsets are taken from
+    opened = {}
+    # smallest subsets first, so that the smallest subsets of every dataset are measured early
+    for fraction in args.fractions or fractions(args.smallest, args.steps):
+        for case, library, (X_train, X_test, y_train, y_test) in iter_runs(args, fraction if fraction < 1.0 else None, opened):
+            print("Benchmarking %s with %s on %.1f%% of the rows (%d examples)" % (case.name, library, 100 * fraction, X_train.shape[0]))
+            row = run_case(case, library, X_train, X_test, y_train, y_test, args.n_jobs, args.warmup, args.repeats,
+                           args.memory, args.trace_memory)
+            rows.extend(dict(r, fraction=fraction) for r in row)
+    df = pd.DataFrame(rows)
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.3g}'.format):
+        print("\nEmpirical complexity (time ~ n^exponent)\n%s" % (complexity(df).to_string(index=False)))
+        cross = crossovers(df)
+        if len(cross):
+            print("\nCrossover points (measured=False: extrapolated from the fits)\n%s" % (cross.to_string(index=False)))
+    if args.plot_dir is not None:
+        for phase in ['fit', 'predict']:
+            for filename in plot_size_scaling(df, args.plot_dir, phase):
+                print("Wrote %s" % (filename))
+    save(args, rows)
+    return 0
+
+def inference(args):
+    names = []
+    for name in args.engines or list(REQUIREMENTS):
+        if missing(name):
+            print("Skipping %s: %s not installed" % (name, ', '.join(missing(name))))
+        else:
+            names.append(name)
+    if not names:
+        raise SystemExit("None of the inference engines can be run")
+
+    print("Loading %s" % (args.dataset))
+    X_train, X_test, y_train, y_test = load_dataset(args.dataset, args.cache_dir, mmap=args.mmap, synthetic=args.synthetic)
+    engines = build_engines(names, X_train, y_train, args.work_dir, args.tree_format, args.n_estimators, args.max_depth)
+
+    from sklearn.metrics import balanced_accuracy_score
+    sizes = args.batch_sizes or batch_sizes()
+    rows = []
+    for n_jobs in args.threads:
+        with pinned(n_jobs), limit_threads(n_jobs):
+            for engine in engines.values():
+                engine.set_threads(n_jobs)
+                y_pred = predict_all(engine.predict, X_test)
+                common = {
+                    'dataset': args.dataset, 'model': engine.model, 'library': engine.name, 'phase': 'predict',
+                    'n_jobs': n_jobs, 'n_features': X_test.shape[1],
+                    'score_name': 'balanced_accuracy_score', 'score': float(balanced_accuracy_score(y_test, y_pred)),
+                }
+                for batch_size in sizes:
+                    times = measure_latency(engine.predict, X_test, batch_size, args.batches, args.warmup, args.max_time)
+                    row = dict(common, batch_size=batch_size, **latency_stats(times, batch_size))
+                    row['t_samples'] = times
+                    print("%-14s %2d threads, batch size %5d: p50 %8.3f ms, p99 %8.3f ms, %10.0f rows/s" %
+                          (engine.name, n_jobs, batch_size, 1000 * row['latency_p50'], 1000 * row['latency_p99'], row['rows_per_s']))
+                    rows.append(row)
+
+    df = add_inference_speedups(pd.DataFrame(rows))
+    with pd.option_context('display.width', 250, 'display.max_columns', None, 'display.float_format', '{:.4g}'.format):
+        print("\np50 latency (ms)\n%s" % (1000 * inference_tables(df, 'latency_p50')))
+        print("\np99 latency (ms)\n%s" % (1000 * inference_tables(df, 'latency_p99')))
+        print("\nThroughput (rows/s)\n%s" % (inference_tables(df, 'rows_per_s')))
+        speed_up = df[df['library'].isin(list(BASELINES))]
+        if len(speed_up):
+            print("\nSpeed-up of the p50 latency over %s\n%s" % (
+                  ', '.join('%s (%s)' % (b, e) for e, b in BASELINES.items()), inference_tables(speed_up, 'speed_up')))
+    rows = [dict(row, speed_up=s) for row, s in zip(rows, df['speed_up'])]
+    save(args, rows)
+    return 0
+
+def list_history(args):
+    store = HistoryStore(args.history)
+    current = fingerprint(get_environment())
+    for version, fp in store.versions():
+        runs = list(store.records(version, fp))
+        print("%-12s %s %3d run(s)%s" % (version, fp, len(runs), ' (this machine)' if fp == current else ''))
+    return 0
+
+def compare_versions(args):
+    store = HistoryStore(args.history)
+    fp = None if args.fingerprint == 'any' else (args.fingerprint or fingerprint(get_environment()))
+    old = store.samples(args.old, fp, args.library)
+    new = store.samples(args.new, fp, args.library)
+    if old.empty or new.empty:
+        print("No results of %s for version %s and fingerprint %s" % (args.library, args.old if old.empty else args.new, fp or 'any'))
+        return 2
+    df = compare(old, new, args.alpha, args.threshold, args.score_tolerance)
+    if df.empty:
+        print("No common benchmark cases between versions %s and %s" % (args.old, args.new))
+        return 2
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(df.to_string(index=False))
+    regressions = df[df['regression']]
+    if len(regressions):
+        print("\n%d regression(s) from %s to %s:" % (len(regressions), args.old, args.new))
+        for _, r in regressions.iterrows():
+            print("  %s/%s %s (%s threads): time x%.2f (p=%.3g), score change %+.4f" %
+                  (r['dataset'], r['model'], r['phase'], r['n_jobs'], r['time_ratio'], r['p_value'], r['score_change']))
+        return 1
+    untestable = df[~df['testable']]
+    if len(untestable):
+        print("\n%d case(s) have too few timing samples for p < %g; at least %d per version are needed (e.g. --repeats %d):" %
+              (len(untestable), args.alpha, min_samples(args.alpha), min_samples(args.alpha)))
+        for _, r in untestable.iterrows():
+            print("  %s/%s %s (%s threads): %d and %d samples" % (r['dataset'], r['model'], r['phase'], r['n_jobs'], r['n_old'], r['n_new']))
+        return 2
+    print("\nNo significant regressions from %s to %s" % (args.old, args.new))
+    return 0
+
+def import_time(args):
+    failed = []
+    for statement in args.statements:
+        times = time_import(statement, args.repeats)
+        median = statistics.median(times)
+        over = median > args.budget
+        print("%s: median %.3f s (min %.3f s, max %.3f s) over %d interpreters, budget %.3f s%s" %
+              (statement, median, min(times), max(times), len(times), args.budget, ' EXCEEDED' if over else ''))
+        if over or args.top:
+            modules = sorted(import_profile(statement), key=lambda m: -m[1])[:args.top or 10]
+            print("  slowest modules (self / cumulative):")
+            for name, own, cumulative in modules:
+                print("  %8.1f ms %8.1f ms  %s" % (1000 * own, 1000 * cumulative, name))
+        if over:
+            failed.append(statement)
+    if failed:
+        print("\nImport time over budget: %s" % (', '.join(failed)))
+        return 1
+    return 0
+
+def add_common_arguments(p):
+    p.add_argument('--datasets', nargs='*', help='datasets to benchmark (default: all)')
+    p.add_argument('--models', nargs='*', help='models to benchmark, e.g. random_forest (default: all)')
+    p.add_argument('--libraries', nargs='*', help='libraries to benchmark, e.g. snapml sklearn (default: all installed)')
+    p.add_argument('--cache-dir', default='cache-dir', help='dataset cache directory (default: %(default)s)')
+    p.add_argument('--mmap', action='store_true', help='memory-map the cached datasets')
+    p.add_argument('--synthetic', type=float, default=None, metavar='SCALE', help='use synthetic datasets with SCALE times the rows of the real ones (no downloads)')
+    p.add_argument('--warmup', type=int, default=1, help='untimed runs before the timed ones (default: %(default)s)')
+    p.add_argument('--repeats', type=int, default=5, help='timed runs (default: %(default)s)')
+    p.add_argument('--memory', action='store_true', help='record the peak and delta RSS of every phase in an extra, untimed run')
+    p.add_argument('--trace-memory', action='store_true', help='like --memory, and trace the Python allocations with tracemalloc')
+    p.add_argument('--json', default=None, help='write the results to this JSON file')
+    p.add_argument('--csv', default=None, help='write the results to this CSV file')
+    p.add_argument('--history', default='benchmark-history', help='add the results to this history store (default: %(default)s; empty to disable)')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark Snap ML against other libraries')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('run', help='time fit and predict of every estimator at a fixed thread count')
+    add_common_arguments(p)
+    p.add_argument('--n-jobs', type=int, default=4, help='threads used by the estimators (default: %(default)s)')
+    p.add_argument('--fraction', type=float, default=None, help='fraction of the rows of each dataset to use')
+
+    p = commands.add_parser('sweep', help='strong scaling: time every estimator at a range of thread counts, pinned to as many cores')
+    add_common_arguments(p)
+    p.add_argument('--threads', type=int, nargs='*', help='thread counts (default: powers of two up to the number of CPUs, and that number)')
+    p.add_argument('--fraction', type=float, default=None, help='fraction of the rows of each dataset to use')
+    p.add_argument('--plot-dir', default=None, help='save speed-up and efficiency plots to this directory')
+
+    p = commands.add_parser('size', help='data-size scaling: time every estimator on growing subsets of the datasets')
+    add_common_arguments(p)
+    p.add_argument('--n-jobs', type=int, default=4, help='threads used by the estimators (default: %(default)s)')
+    p.add_argument('--fractions', type=float, nargs='*', help='fractions of the rows to use (default: --steps fractions from --smallest to 1)')
+    p.add_argument('--smallest', type=float, default=0.01, help='smallest fraction (default: %(default)s)')
+    p.add_argument('--steps', type=int, default=8, help='number of geometrically spaced fractions (default: %(default)s)')
+    p.add_argument('--plot-dir', default=None, help='save time vs. size plots to this directory')
+
+    p = commands.add_parser('inference', help='latency and throughput of imported Snap ML models vs. the native libraries across batch sizes')
+    p.add_argument('--dataset', default='CreditCardFraud', help='dataset to train on and score (default: %(default)s)')
+    p.add_argument('--engines', nargs='*', choices=list(REQUIREMENTS), help='engines to benchmark (default: all installed)')
+    p.add_argument('--threads', type=int, nargs='*', default=[1, 4], help='thread counts (default: %(default)s)')
+    p.add_argument('--batch-sizes', type=int, nargs='*', help='batch sizes (default: powers of two from 1 to %d, and %d)' % (MAX_BATCH_SIZE // 2 + 1, MAX_BATCH_SIZE))
+    p.add_argument('--batches', type=int, default=100, help='timed batches per batch size (default: %(default)s)')
+    p.add_argument('--warmup', type=int, default=5, help='untimed batches per batch size (default: %(default)s)')
+    p.add_argument('--max-time', type=float, default=10.0, help='seconds after which to stop timing a batch size, after at least 10 batches (default: %(default)s)')
+    p.add_argument('--tree-format', default='auto', help="tree format of the imported Snap ML models, e.g. 'zdnn_tensors' for the IBM Z AI accelerator (default: %(default)s)")
+    p.add_argument('--n-estimators', type=int, default=200, help='number of trees (default: %(default)s)')
+    p.add_argument('--max-depth', type=int, default=6, help='maximum tree depth (default: %(default)s)')
+    p.add_argument('--work-dir', default='inference-models', help='where the exported models are written (default: %(default)s)')
+    p.add_argument('--cache-dir', default='cache-dir', help='dataset cache directory (default: %(default)s)')
+    p.add_argument('--mmap', action='store_true', help='memory-map the cached dataset')
+    p.add_argument('--synthetic', type=float, default=None, metavar='SCALE', help='use a synthetic dataset with SCALE times the rows of the real one (no download)')
+    p.add_argument('--json', default=None, help='write the results to this JSON file')
+    p.add_argument('--csv', default=None, help='write the results to this CSV file')
+    p.add_argument('--history', default='benchmark-history', help='add the results to this history store (default: %(default)s; empty to disable)')
+
+    p = commands.add_parser('history', help='list the Snap ML versions and environments in the history store')
+    p.add_argument('--history', default='benchmark-history', help='history store (default: %(default)s)')
+
+    p = commands.add_parser('compare', help='test for regressions between two Snap ML versions; exits with 1 if there are any, and with 2 '
+                                            'if a case has too few timing samples to be tested (at least 4 per version with the default --alpha)')
+    p.add_argument('old', help='baseline Snap ML version')
+    p.add_argument('new', help='Snap ML version to test')
+    p.add_argument('--history', default='benchmark-history', help='history store (default: %(default)s)')
+    p.add_argument('--fingerprint', default=None, help="environment fingerprint to compare on (default: this machine's; 'any' for all)")
+    p.add_argument('--library', default='snapml', help='library whose results are compared (default: %(default)s)')
+    p.add_argument('--alpha', type=float, default=0.05, help='significance level of the timing test; the timing samples of a case, pooled over runs, '
+                                                          'must be at least 4 per version for 0.05 and 5 for 0.01 (default: %(default)s)')
+    p.add_argument('--threshold', type=float, default=0.05, help='relative slowdown of the median that counts as a regression (default: %(default)s)')
+    p.add_argument('--score-tolerance', type=float, default=0.001, help='relative score loss that counts as a regression (default: %(default)s)')
+
+    p = commands.add_parser('imports', help='time imports in fresh interpreters; exits with 1 if one takes longer than the budget')
+    p.add_argument('statements', nargs='*', default=['from datasets import Higgs'], help="import statements to time (default: 'from datasets import Higgs')")
+    p.add_argument('--budget', type=float, default=0.5, help='maximum median time of each statement in seconds (default: %(default)s)')
+    p.add_argument('--repeats', type=int, default=5, help='number of fresh interpreters per statement (default: %(default)s)')
+    p.add_argument('--top', type=int, default=0, help='also list this many of the slowest modules imported (always done when over budget)')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'sweep':
+        return sweep(args)
+    if args.command == 'size':
+        return size(args)
+    if args.command == 'inference':
+        return inference(args)
+    if args.command == 'history':
+        return list_history(args)
+    if args.command == 'compare':
+        return compare_versions(args)
+    if args.command == 'imports':
+        return import_time(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
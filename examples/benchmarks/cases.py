@@ -0,0 +1,149 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import numpy as np
+
+class Case():
+    """
+    A dataset together with the estimators that the training notebooks compare on it.
+
+    `estimators` maps a library name to (module, class name, keyword arguments); keyword
+    arguments that are such tuples themselves are built first, e.g. the estimator of a
+    meta-estimator. The thread count is passed as `n_jobs` to estimators that take it. `score` is the name
+    of a function in `sklearn.metrics`, applied to the output of `predict_proba` (positive
+    class) if `proba` is set and of `predict` otherwise.
+    """
+
+    def __init__(self, dataset, model, estimators, score, proba=True):
+        self.dataset = dataset
+        self.model = model
+        self.estimators = estimators
+        self.score = score
+        self.proba = proba
+
+    @property
+    def name(self):
+        return '%s/%s' % (self.dataset, self.model)
+
+    def libraries(self):
+        return list(self.estimators)
+
+    def make_estimator(self, library, n_jobs=None):
+        estimator = _build(self.estimators[library])
+        if n_jobs is not None and 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=n_jobs)
+        return estimator
+
+    def predict(self, estimator, X):
+        if self.proba:
+            proba = estimator.predict_proba(X)
+            if proba.shape[1] > 1:
+                return proba[:, 1]
+            # trained on a single class: the positive class has probability 1 if it is that class, 0 otherwise
+            classes = getattr(estimator, 'classes_', None)
+            return proba[:, 0] if classes is not None and classes[0] > 0 else np.zeros(proba.shape[0])
+        return estimator.predict(X)
+
+    def evaluate(self, y_true, y_pred):
+        metrics = importlib.import_module('sklearn.metrics')
+        return float(getattr(metrics, self.score)(y_true, y_pred))
+
+def _build(spec):
+    module, cls, kwargs = spec
+    kwargs = {k: _build(v) if isinstance(v, tuple) else v for k, v in kwargs.items()}
+    return getattr(importlib.import_module(module), cls)(**kwargs)
+
+def _lr(ovr=False):
+    # recent scikit-learn releases no longer take multi_class, so one-vs-rest wraps the estimator
+    lr = ('sklearn.linear_model', 'LogisticRegression', dict(fit_intercept=False))
+    return {
+        'sklearn': ('sklearn.multiclass', 'OneVsRestClassifier', dict(estimator=lr)) if ovr else lr,
+        'snapml': ('snapml', 'LogisticRegression', dict(fit_intercept=False)),
+    }
+
+def _svm(sklearn_kwargs, snapml_kwargs):
+    return {
+        'sklearn': ('sklearn.svm', 'LinearSVC', dict(loss='hinge', random_state=42, **sklearn_kwargs)),
+        'snapml': ('snapml', 'SupportVectorMachine', dict(random_state=42, **snapml_kwargs)),
+    }
+
+def _dt(max_depth, **kwargs):
+    return {
+        'sklearn': ('sklearn.tree', 'DecisionTreeClassifier', dict(max_depth=max_depth, **kwargs)),
+        'snapml': ('snapml', 'DecisionTreeClassifier', dict(max_depth=max_depth, **kwargs)),
+    }
+
+def _rf(max_depth, use_histograms=True):
+    kwargs = dict(max_depth=max_depth, n_estimators=100, random_state=42)
+    snapml_kwargs = dict(kwargs, use_histograms=True) if use_histograms else kwargs
+    return {
+        'sklearn': ('sklearn.ensemble', 'RandomForestClassifier', kwargs),
+        'snapml': ('snapml', 'RandomForestClassifier', snapml_kwargs),
+    }
+
+def _boosting(kind, objectives):
+    # common hyper-parameters of the boosting notebooks
+    xgb_objective, lgbm_objective, snapml_objective = objectives
+    return {
+        'xgboost': ('xgboost', 'XGB%s' % (kind), dict(objective=xgb_objective, tree_method='hist', learning_rate=0.5, n_estimators=100, max_depth=6,
+                                                    reg_lambda=0.1, max_delta_step=0.7, min_child_weight=0.0, max_bin=256, random_state=42)),
+        'lightgbm': ('lightgbm', 'LGBM%s' % (kind), dict(objective=lgbm_objective, learning_rate=0.5, n_estimators=100, max_depth=6, reg_alpha=0.1,
+                                                       max_delta_step=0.7, min_child_weight=0.0, max_bin=256, num_leaves=2**6, random_state=42)),
+        'snapml': ('snapml', 'BoostingMachine%s' % (kind), dict(objective=snapml_objective, learning_rate=0.5, num_round=100, max_depth=6, lambda_l2=0.1,
+                                                             max_delta_step=0.7, use_histograms=True, hist_nbins=256, random_state=42)),
+    }
+
+CASES = [
+    Case('Allstate', 'decision_tree', _dt(8), 'roc_auc_score'),
+    Case('CreditCardFraud', 'decision_tree', _dt(16, random_state=42), 'roc_auc_score'),
+    Case('Epsilon', 'decision_tree', _dt(8), 'roc_auc_score'),
+    Case('Higgs', 'decision_tree', _dt(8), 'roc_auc_score'),
+    Case('Susy', 'decision_tree', _dt(8), 'roc_auc_score'),
+
+    Case('Allstate', 'logistic_regression', _lr(), 'roc_auc_score'),
+    Case('Avazu', 'logistic_regression', _lr(), 'roc_auc_score'),
+    Case('Epsilon', 'logistic_regression', _lr(), 'roc_auc_score'),
+    Case('Higgs', 'logistic_regression', _lr(), 'roc_auc_score'),
+    Case('Mnist8m', 'logistic_regression', _lr(ovr=True), 'accuracy_score', proba=False),
+    Case('Susy', 'logistic_regression', _lr(), 'roc_auc_score'),
+
+    Case('Allstate', 'random_forest', _rf(6), 'roc_auc_score'),
+    Case('CreditCardFraud', 'random_forest', _rf(8), 'roc_auc_score'),
+    Case('Epsilon', 'random_forest', _rf(8, use_histograms=False), 'roc_auc_score'),
+    Case('Higgs', 'random_forest', _rf(8), 'roc_auc_score'),
+    Case('Susy', 'random_forest', _rf(8), 'roc_auc_score'),
+
+    Case('Allstate', 'support_vector_machine', _svm(dict(class_weight='balanced', fit_intercept=False), dict(class_weight='balanced', fit_intercept=False)), 'accuracy_score', proba=False),
+    Case('Avazu', 'support_vector_machine', _svm(dict(class_weight='balanced', fit_intercept=False), dict(class_weight='balanced', fit_intercept=False)), 'accuracy_score', proba=False),
+    Case('Epsilon', 'support_vector_machine', _svm({}, {}), 'accuracy_score', proba=False),
+    Case('Higgs', 'support_vector_machine', _svm({}, {}), 'accuracy_score', proba=False),
+    Case('Mnist8m', 'support_vector_machine', _svm(dict(multi_class='ovr'), {}), 'accuracy_score', proba=False),
+    Case('Susy', 'support_vector_machine', _svm(dict(fit_intercept=False), dict(fit_intercept=False)), 'accuracy_score', proba=False),
+
+    Case('CreditCardFraud', 'boosting_machine', _boosting('Classifier', ('binary:logistic', 'binary', 'logloss')), 'roc_auc_score'),
+    Case('M5Forecasting', 'boosting_machine', _boosting('Regressor', ('count:poisson', 'poisson', 'poisson')), 'mean_poisson_deviance', proba=False),
+]
+
+def select_cases(datasets=None, models=None):
+    def match(value, wanted):
+        return not wanted or value.lower() in [w.lower() for w in wanted]
+    return [case for case in CASES if match(case.dataset, datasets) and match(case.model, models)]
+
+def available(library):
+    try:
+        importlib.import_module(library)
+        return True
+    except ImportError:
+        return False
@@ -0,0 +1,152 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+
+# environment fields that identify the software under test rather than the machine
+VERSION_FIELDS = ['snapml_version']
+
+# environment fields that depend on what a run has imported (e.g. the OpenMP pools of the benchmarked libraries)
+VOLATILE_FIELDS = ['thread_pools']
+
+def fingerprint(environment):
+    """
+    Short hash of the environment, excluding the Snap ML version, so that runs of different
+    versions on the same machine and software stack share a fingerprint.
+    """
+
+    fields = {k: v for k, v in environment.items() if k not in VERSION_FIELDS + VOLATILE_FIELDS}
+    blob = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:12]
+
+class HistoryStore():
+    """
+    Directory of benchmark runs, stored as `<version>/<fingerprint>-<time>.json`.
+
+    Every run records the environment it was measured in and its result rows, including
+    the individual timing samples, so that runs can be compared statistically later on.
+    Stores of several machines can be merged by copying their files together.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def add(self, environment, rows, command):
+        version = str(environment.get('snapml_version') or 'unknown')
+        record = {
+            'version': version,
+            'fingerprint': fingerprint(environment),
+            'time': time.time(),
+            'command': command,
+            'environment': environment,
+            'results': rows,
+        }
+        directory = os.path.join(self.path, version)
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, '%s-%s' % (record['fingerprint'], time.strftime('%Y%m%d-%H%M%S')))
+        filename, i = stem + '.json', 1
+        while os.path.exists(filename):
+            filename, i = '%s-%d.json' % (stem, i), i + 1
+        with open(filename, 'w') as f:
+            json.dump(record, f, indent=1, default=str)
+        return filename
+
+    def records(self, version=None, fingerprint=None):
+        pattern = os.path.join(self.path, version or '*', '%s-*.json' % (fingerprint or '*'))
+        for filename in sorted(glob.glob(pattern)):
+            with open(filename) as f:
+                yield json.load(f)
+
+    def versions(self):
+        return sorted({(r['version'], r['fingerprint']) for r in self.records()})
+
+    def samples(self, version, fingerprint=None, library=None):
+        """
+        All result rows of `version` (optionally of one fingerprint and library), as a DataFrame.
+        """
+
+        rows = []
+        for record in self.records(version, fingerprint):
+            for row in record['results']:
+                if library is None or row['library'] == library:
+                    rows.append(dict(row, fingerprint=record['fingerprint']))
+        return pd.DataFrame(rows)
+
+def lower_is_better(score_name):
+    return any(word in score_name for word in ['loss', 'deviance', 'error'])
+
+def _mann_whitney(old, new):
+    # one-sided p-value for `new` being slower than `old`
+    from scipy.stats import mannwhitneyu
+    return float(mannwhitneyu(new, old, alternative='greater').pvalue)
+
+def min_p_value(n_old, n_new):
+    # the smallest one-sided p-value the exact test can give for these sample sizes (no ties)
+    from math import comb
+    return 1.0 / comb(n_old + n_new, n_old) if min(n_old, n_new) > 1 else 1.0
+
+def min_samples(alpha):
+    # the number of samples per version needed for the test to reach p < `alpha`
+    n = 2
+    while min_p_value(n, n) >= alpha:
+        n += 1
+    return n
+
+def compare(old, new, alpha=0.05, threshold=0.05, score_tolerance=0.001):
+    """
+    Compare two sets of result rows per dataset, model, library, phase, thread count and, for
+    inference results, batch size.
+
+    The timing samples of all runs of each set are pooled. A timing regression is a
+    one-sided Mann-Whitney U test with p < `alpha` that the new times are larger, together
+    with a slowdown of the median by more than `threshold`. A score regression is a
+    relative loss of more than `score_tolerance` in the mean score. `testable` is False
+    where there are too few samples for the test to ever reach p < `alpha`.
+    """
+
+    keys = ['dataset', 'model', 'library', 'phase', 'n_jobs']
+    # inference results are measured per batch size
+    keys += [k for k in ['batch_size'] if k in old and k in new]
+    rows = []
+    new_groups = {k: g for k, g in new.groupby(keys, dropna=False)}
+    for k, g_old in old.groupby(keys, dropna=False):
+        g_new = new_groups.get(k)
+        if g_new is None:
+            continue
+        t_old = np.concatenate([np.asarray(s, dtype=np.float64) for s in g_old['t_samples']])
+        t_new = np.concatenate([np.asarray(s, dtype=np.float64) for s in g_new['t_samples']])
+        ratio = np.median(t_new) / np.median(t_old)
+        p = _mann_whitney(t_old, t_new) if min(len(t_old), len(t_new)) > 1 else 1.0
+        score_old, score_new = g_old['score'].mean(), g_new['score'].mean()
+        change = (score_new - score_old) / abs(score_old) if score_old != 0 else score_new - score_old
+        if lower_is_better(g_old['score_name'].iloc[0]):
+            change = -change
+        time_regression = bool(p < alpha and ratio > 1.0 + threshold)
+        # the score is computed on predictions, so report it with the predict phase only
+        score_regression = bool(k[3] == 'predict' and change < -score_tolerance)
+        rows.append(dict(zip(keys, k), **{
+            'n_old': len(t_old), 'n_new': len(t_new),
+            't_median_old': float(np.median(t_old)), 't_median_new': float(np.median(t_new)),
+            'time_ratio': float(ratio), 'p_value': p, 'testable': min_p_value(len(t_old), len(t_new)) < alpha,
+            'score_old': float(score_old), 'score_new': float(score_new), 'score_change': float(change),
+            'time_regression': time_regression, 'score_regression': score_regression,
+            'regression': time_regression or score_regression,
+        }))
+    return pd.DataFrame(rows)
@@ -0,0 +1,45 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import subprocess
+
+# the directory that contains the datasets, utils and benchmarks packages
+EXAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# times `statement` inside a fresh interpreter, leaving out the start-up of the interpreter itself
+TIMER = "import time; _t = time.perf_counter(); %s; print(time.perf_counter() - _t)"
+
+def _run(args):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [EXAMPLES_DIR, os.environ.get('PYTHONPATH')])))
+    return subprocess.run([sys.executable] + args, cwd=EXAMPLES_DIR, env=env, capture_output=True, text=True, check=True)
+
+def time_import(statement, repeats=5):
+    # the time taken by `statement` in each of `repeats` fresh interpreters, in seconds
+    return [float(_run(['-c', TIMER % (statement)]).stdout.split()[-1]) for _ in range(repeats)]
+
+def import_profile(statement):
+    """
+    The modules imported by `statement`, as (module, self time, cumulative time) in seconds,
+    from the `-X importtime` output of a fresh interpreter.
+    """
+
+    modules = []
+    for line in _run(['-X', 'importtime', '-c', statement]).stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return modules
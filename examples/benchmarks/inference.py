@@ -0,0 +1,155 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from benchmarks.cases import available
+
+# the Snap ML prediction engine scores batches of fewer than 32768 rows
+MAX_BATCH_SIZE = 32767
+
+# the library each imported Snap ML model is compared against
+BASELINES = {'snapml': 'sklearn', 'snapml-xgboost': 'xgboost'}
+
+# the libraries each engine needs
+REQUIREMENTS = {
+    'sklearn': ['sklearn'],
+    'snapml': ['snapml', 'sklearn2pmml'],
+    'xgboost': ['xgboost'],
+    'snapml-xgboost': ['snapml', 'xgboost'],
+}
+
+def missing(engine):
+    # the libraries needed by `engine` that are not installed
+    return [library for library in REQUIREMENTS[engine] if not available(library)]
+
+def batch_sizes(largest=MAX_BATCH_SIZE):
+    # 1, 2, 4, ... and `largest`
+    sizes = [1 << i for i in range(largest.bit_length()) if 1 << i < largest]
+    return sizes + [largest]
+
+class Engine():
+    """
+    A trained model and how to score a batch with it; `set_threads` sets the thread count used by `predict`.
+    """
+
+    def __init__(self, name, model, estimator, predict, thread_param='n_jobs'):
+        self.name = name
+        self.model = model
+        self.estimator = estimator
+        self.predict = predict
+        self.thread_param = thread_param
+
+    def set_threads(self, n_jobs):
+        self.estimator.set_params(**{self.thread_param: n_jobs})
+
+def build_engines(names, X_train, y_train, work_dir, tree_format='auto', n_estimators=200, max_depth=6):
+    """
+    Train a scikit-learn random forest (in a PMML pipeline, as in the inference notebook) and an
+    XGBoost model, and import them into Snap ML, as far as needed by the engines in `names`.
+    """
+
+    engines = {}
+    os.makedirs(work_dir, exist_ok=True)
+
+    if 'sklearn' in names or 'snapml' in names:
+        from sklearn.ensemble import RandomForestClassifier
+        model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, n_jobs=4, random_state=42)
+        if 'snapml' in names:
+            from sklearn2pmml import sklearn2pmml, PMMLPipeline
+            pipeline = PMMLPipeline([("model", model)]).fit(X_train, y_train)
+            pmml_file = os.path.join(work_dir, 'model.pmml')
+            sklearn2pmml(pipeline, pmml_file, with_repr=True)
+            engines['sklearn'] = Engine('sklearn', 'random_forest', pipeline, pipeline.predict, 'model__n_jobs')
+
+            from snapml import RandomForestClassifier as SnapRandomForestClassifier
+            snapml_model = SnapRandomForestClassifier()
+            snapml_model.import_model(pmml_file, 'pmml', tree_format=tree_format)
+            engines['snapml'] = Engine('snapml', 'random_forest', snapml_model, snapml_model.predict)
+        else:
+            model.fit(X_train, y_train)
+            engines['sklearn'] = Engine('sklearn', 'random_forest', model, model.predict)
+
+    if 'xgboost' in names or 'snapml-xgboost' in names:
+        from xgboost import XGBClassifier
+        model = XGBClassifier(n_estimators=n_estimators, max_depth=max_depth, tree_method='hist', n_jobs=4, random_state=42)
+        model.fit(X_train, y_train)
+        engines['xgboost'] = Engine('xgboost', 'boosting_machine', model, model.predict)
+        if 'snapml-xgboost' in names:
+            json_file = os.path.join(work_dir, 'model.json')
+            model.get_booster().save_model(json_file)
+            from snapml import BoostingMachineClassifier
+            snapml_model = BoostingMachineClassifier()
+            snapml_model.import_model(json_file, 'xgb_json', tree_format=tree_format)
+            engines['snapml-xgboost'] = Engine('snapml-xgboost', 'boosting_machine', snapml_model, snapml_model.predict)
+
+    return {name: engines[name] for name in names if name in engines}
+
+def predict_all(predict, X, batch_size=MAX_BATCH_SIZE):
+    # predictions for all rows of `X`, in batches that the Snap ML engine accepts
+    return np.concatenate([predict(X[i:i+batch_size]) for i in range(0, X.shape[0], batch_size)])
+
+def _take(X, rows):
+    batch = X[rows]
+    return batch if hasattr(batch, 'tocsr') else np.ascontiguousarray(batch)
+
+def measure_latency(predict, X, batch_size, n_batches=100, warmup=5, max_time=10.0, min_batches=10, seed=1000):
+    """
+    Time `predict` on `warmup` + `n_batches` batches of `batch_size` random rows of `X` (drawn with
+    replacement, outside of the timed region). Stops early after `max_time` seconds once
+    `min_batches` batches have been timed. Returns the latencies in seconds.
+    """
+
+    rng = np.random.RandomState(seed)
+    times = []
+    start = time.perf_counter()
+    for i in range(warmup + n_batches):
+        batch = _take(X, rng.randint(0, X.shape[0], batch_size))
+        t0 = time.perf_counter()
+        predict(batch)
+        t = time.perf_counter() - t0
+        if i >= warmup:
+            times.append(t)
+            if len(times) >= min_batches and time.perf_counter() - start > max_time:
+                break
+    return times
+
+def latency_stats(times, batch_size):
+    times = np.asarray(times, dtype=np.float64)
+    return {
+        'n_batches': len(times),
+        'latency_p50': float(np.percentile(times, 50)),
+        'latency_p99': float(np.percentile(times, 99)),
+        'latency_mean': float(np.mean(times)),
+        'rows_per_s': float(batch_size * len(times) / np.sum(times)),
+    }
+
+def add_inference_speedups(df):
+    # p50 latency of the baseline / p50 latency of the imported Snap ML model
+    keys = ['dataset', 'batch_size', 'n_jobs']
+    df = df.copy()
+    df['speed_up'] = np.nan
+    for engine, baseline in BASELINES.items():
+        base = df[df['library'] == baseline].set_index(keys)['latency_p50']
+        rows = df['library'] == engine
+        index = pd.MultiIndex.from_frame(df.loc[rows, keys])
+        df.loc[rows, 'speed_up'] = base.reindex(index).values / df.loc[rows, 'latency_p50'].values
+    return df
+
+def inference_tables(df, value):
+    # one row per thread count and library, one column per batch size
+    return df.pivot_table(index=['n_jobs', 'library'], columns='batch_size', values=value)
@@ -0,0 +1,155 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import time
+import json
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+
+from datasets.memory import MemoryMonitor
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+def summarize(samples, confidence=0.95, n_resamples=2000, seed=0):
+    """
+    Median, mean, p95, min and max of `samples`, with a bootstrap confidence interval of the median.
+    """
+
+    samples = np.asarray(samples, dtype=np.float64)
+    rng = np.random.RandomState(seed)
+    medians = np.median(samples[rng.randint(0, len(samples), (n_resamples, len(samples)))], axis=1)
+    alpha = (1.0 - confidence) / 2.0
+    return {
+        'n': len(samples),
+        'median': float(np.median(samples)),
+        'mean': float(np.mean(samples)),
+        'std': float(np.std(samples, ddof=1)) if len(samples) > 1 else 0.0,
+        'p95': float(np.percentile(samples, 95)),
+        'min': float(np.min(samples)),
+        'max': float(np.max(samples)),
+        'ci_low': float(np.quantile(medians, alpha)),
+        'ci_high': float(np.quantile(medians, 1.0 - alpha)),
+    }
+
+@contextmanager
+def limit_threads(n_threads):
+    # caps the BLAS and OpenMP pools used by numpy, scipy and sklearn
+    if n_threads is None or threadpool_limits is None:
+        yield
+        return
+    with threadpool_limits(limits=n_threads):
+        yield
+
+def measure(fn, warmup=1, repeats=5):
+    """
+    Call `fn` `warmup` times untimed and `repeats` times timed.
+
+    Returns the wall-clock (`perf_counter`) and process CPU (`process_time`) seconds
+    of the timed calls and the result of the last call.
+    """
+
+    for _ in range(warmup):
+        fn()
+    wall, cpu = [], []
+    result = None
+    for _ in range(repeats):
+        # collect garbage of earlier repeats outside of the timed region
+        gc.collect()
+        t0, c0 = time.perf_counter(), time.process_time()
+        result = fn()
+        wall.append(time.perf_counter() - t0)
+        cpu.append(time.process_time() - c0)
+    return wall, cpu, result
+
+def measure_memory(fn, trace=False):
+    """
+    Call `fn` once under a `MemoryMonitor`; returns its memory summary and the result.
+    """
+
+    gc.collect()
+    with MemoryMonitor(trace=trace) as monitor:
+        result = fn()
+    return monitor.summary(), result
+
+def run_case(case, library, X_train, X_test, y_train, y_test, n_jobs=None, warmup=1, repeats=5, memory=False, trace_memory=False):
+    """
+    Benchmark `fit` and `predict` of one estimator of `case` and return one result row per phase.
+
+    With `memory` (or `trace_memory`), each phase is run once more after the timed runs to record
+    its peak and delta memory, so that the sampling and tracing do not disturb the timings.
+    """
+
+    fit = lambda: case.make_estimator(library, n_jobs).fit(X_train, y_train)
+    with limit_threads(n_jobs):
+        fit_wall, fit_cpu, model = measure(fit, warmup, repeats)
+        predict_wall, predict_cpu, y_pred = measure(lambda: case.predict(model, X_test), warmup, repeats)
+        mem = {}
+        if memory or trace_memory:
+            del model
+            mem['fit'], model = measure_memory(fit, trace_memory)
+            mem['predict'], _ = measure_memory(lambda: case.predict(model, X_test), trace_memory)
+
+    common = {
+        'dataset': case.dataset,
+        'model': case.model,
+        'library': library,
+        'estimator': type(model).__name__,
+        'n_jobs': n_jobs,
+        'n_examples_train': X_train.shape[0],
+        'n_examples_test': X_test.shape[0],
+        'n_features': X_train.shape[1],
+        'score_name': case.score,
+        'score': case.evaluate(y_test, y_pred),
+        'warmup': warmup,
+    }
+    rows = []
+    for phase, wall, cpu in [('fit', fit_wall, fit_cpu), ('predict', predict_wall, predict_cpu)]:
+        row = dict(common, phase=phase)
+        row.update({'t_%s' % (k): v for k, v in summarize(wall).items()})
+        row['cpu_median'] = float(np.median(cpu))
+        row.update(mem.get(phase, {}))
+        row['t_samples'] = wall
+        rows.append(row)
+    return rows
+
+def add_speedups(df, baseline='sklearn'):
+    """
+    Add `speed_up` (baseline median time / median time) and whether the confidence intervals of the
+    two medians are disjoint (`significant`), per dataset, model, phase and thread count.
+    """
+
+    keys = ['dataset', 'model', 'phase', 'n_jobs']
+    base = df[df['library'] == baseline][keys + ['t_median', 't_ci_low', 't_ci_high']]
+    base = base.rename(columns={c: 'baseline_' + c for c in ['t_median', 't_ci_low', 't_ci_high']})
+    df = df.merge(base, on=keys, how='left')
+    df['speed_up'] = df['baseline_t_median'] / df['t_median']
+    df['significant'] = (df['t_ci_high'] < df['baseline_t_ci_low']) | (df['t_ci_low'] > df['baseline_t_ci_high'])
+    return df.drop(columns=['baseline_t_ci_low', 'baseline_t_ci_high'])
+
+def write_results(rows, environment, json_file=None, csv_file=None):
+    if json_file is not None:
+        with open(json_file, 'w') as f:
+            json.dump({'environment': environment, 'results': rows}, f, indent=1, default=str)
+        print("Wrote results to %s" % (json_file))
+    if csv_file is not None:
+        df = pd.DataFrame([{k: v for k, v in row.items() if k != 't_samples'} for row in rows])
+        for k, v in environment.items():
+            df[k] = v
+        df.to_csv(csv_file, index=False)
+        print("Wrote results to %s" % (csv_file))
@@ -0,0 +1,137 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import numpy as np
+from contextlib import contextmanager
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+def cpu_order(cpus=None):
+    """
+    The CPUs to pin to, one hardware thread per physical core first, followed by their SMT siblings.
+    """
+
+    cpus = available_cpus() if cpus is None else cpus
+    first, siblings = [], []
+    seen = set()
+    for cpu in cpus:
+        try:
+            with open('/sys/devices/system/cpu/cpu%d/topology/core_id' % (cpu)) as f:
+                core = f.read().strip()
+            with open('/sys/devices/system/cpu/cpu%d/topology/physical_package_id' % (cpu)) as f:
+                core = (f.read().strip(), core)
+        except OSError:
+            core = cpu
+        if core in seen:
+            siblings.append(cpu)
+        else:
+            seen.add(core)
+            first.append(cpu)
+    return first + siblings
+
+def thread_counts(max_threads=None):
+    # 1, 2, 4, ... up to and including `max_threads`
+    max_threads = max_threads or len(available_cpus())
+    counts = [1 << i for i in range(max_threads.bit_length()) if 1 << i <= max_threads]
+    return counts if counts[-1] == max_threads else counts + [max_threads]
+
+def _set_affinity(cpus):
+    # applies to every thread of the process, including thread pools created earlier
+    try:
+        tids = [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        tids = [0]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass
+
+@contextmanager
+def pinned(n_threads):
+    """
+    Restrict the process to the first `n_threads` CPUs of `cpu_order()` (a no-op where affinity is not supported).
+    """
+
+    if not hasattr(os, 'sched_setaffinity'):
+        yield None
+        return
+    previous = os.sched_getaffinity(0)
+    cpus = cpu_order()[:n_threads]
+    _set_affinity(cpus)
+    try:
+        yield cpus
+    finally:
+        _set_affinity(previous)
+
+def strong_scaling(df):
+    """
+    Speed-up (median time at 1 thread / median time at n threads) and parallel efficiency
+    (speed-up / n) for every dataset, model, library and phase of a thread sweep.
+    """
+
+    keys = ['dataset', 'model', 'library', 'phase']
+    base = df[df['n_jobs'] == 1][keys + ['t_median']].rename(columns={'t_median': 't_serial'})
+    df = df.merge(base, on=keys, how='left')
+    df['scaling_speed_up'] = df['t_serial'] / df['t_median']
+    df['efficiency'] = df['scaling_speed_up'] / df['n_jobs']
+    return df
+
+def scaling_tables(df, phase='fit'):
+    # one row per dataset, model and library, one column per thread count
+    df = df[df['phase'] == phase]
+    index = ['dataset', 'model', 'library']
+    return (df.pivot_table(index=index, columns='n_jobs', values='scaling_speed_up'),
+            df.pivot_table(index=index, columns='n_jobs', values='efficiency'))
+
+def plot_scaling(df, out_dir, phase='fit'):
+    """
+    Save a speed-up and efficiency plot per dataset and model to `out_dir`; returns the file names.
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    df = df[df['phase'] == phase]
+    for (dataset, model), group in df.groupby(['dataset', 'model']):
+        fig, (ax_s, ax_e) = plt.subplots(1, 2, figsize=(10, 4))
+        threads = np.array(sorted(group['n_jobs'].unique()))
+        ax_s.plot(threads, threads, 'k--', label='ideal')
+        for library, g in group.groupby('library'):
+            g = g.sort_values('n_jobs')
+            ax_s.plot(g['n_jobs'], g['scaling_speed_up'], 'o-', label=library)
+            ax_e.plot(g['n_jobs'], g['efficiency'], 'o-', label=library)
+        ax_s.set_xscale('log', base=2)
+        ax_s.set_yscale('log', base=2)
+        ax_s.set_xlabel('threads')
+        ax_s.set_ylabel('speed-up over 1 thread')
+        ax_e.set_xscale('log', base=2)
+        ax_e.set_ylim(0, 1.1)
+        ax_e.set_xlabel('threads')
+        ax_e.set_ylabel('parallel efficiency')
+        ax_s.legend()
+        fig.suptitle('%s: %s (%s)' % (dataset, model, phase))
+        fig.tight_layout()
+        filename = os.path.join(out_dir, 'scaling-%s-%s-%s.png' % (dataset, model, phase))
+        fig.savefig(filename)
+        plt.close(fig)
+        files.append(filename)
+    return files
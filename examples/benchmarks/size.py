@@ -0,0 +1,127 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import numpy as np
+import pandas as pd
+
+def fractions(smallest=0.01, steps=8):
+    # geometrically growing fractions of a dataset, from `smallest` to 1
+    return [float(f) for f in np.geomspace(smallest, 1.0, steps)]
+
+def fit_power_law(n, t):
+    """
+    Least-squares fit of t = c * n^k in log-log space; returns (k, log c, r^2).
+    """
+
+    x, y = np.log(np.asarray(n, dtype=np.float64)), np.log(np.asarray(t, dtype=np.float64))
+    k, log_c = np.polyfit(x, y, 1)
+    residual = y - (k * x + log_c)
+    total = np.sum((y - y.mean()) ** 2)
+    r2 = 1.0 - np.sum(residual ** 2) / total if total > 0 else 1.0
+    return float(k), float(log_c), float(r2)
+
+def complexity(df):
+    """
+    Empirical complexity exponent k of the median time in the number of training examples,
+    per dataset, model, library and phase.
+    """
+
+    rows = []
+    for (dataset, model, library, phase), g in df.groupby(['dataset', 'model', 'library', 'phase']):
+        if g['n_examples_train'].nunique() < 2:
+            continue
+        k, log_c, r2 = fit_power_law(g['n_examples_train'], g['t_median'])
+        rows.append({'dataset': dataset, 'model': model, 'library': library, 'phase': phase,
+                     'exponent': k, 'log_coefficient': log_c, 'r2': r2})
+    return pd.DataFrame(rows)
+
+def crossover(n, t_a, t_b):
+    """
+    Number of examples at which `t_a` and `t_b` cross, and whether it was interpolated between
+    measured sizes (True) or extrapolated from power-law fits (False). Returns (None, None) if
+    the fitted curves are parallel.
+    """
+
+    n, t_a, t_b = (np.asarray(v, dtype=np.float64) for v in (n, t_a, t_b))
+    order = np.argsort(n)
+    n, d = n[order], np.log(t_a[order]) - np.log(t_b[order])
+    for i in range(len(n) - 1):
+        if d[i] == 0.0:
+            return float(n[i]), True
+        if d[i] * d[i+1] < 0.0:
+            # linear interpolation of the log-time difference in log n
+            x0, x1 = np.log(n[i]), np.log(n[i+1])
+            return float(np.exp(x0 - d[i] * (x1 - x0) / (d[i+1] - d[i]))), True
+    k_a, c_a, _ = fit_power_law(n, t_a[order])
+    k_b, c_b, _ = fit_power_law(n, t_b[order])
+    if k_a == k_b:
+        return None, None
+    return float(np.exp((c_b - c_a) / (k_a - k_b))), False
+
+def crossovers(df, library='snapml'):
+    """
+    Crossover points between `library` and every other library, per dataset, model and phase.
+    """
+
+    rows = []
+    for (dataset, model, phase), g in df.groupby(['dataset', 'model', 'phase']):
+        times = g.pivot_table(index='n_examples_train', columns='library', values='t_median')
+        if library not in times or len(times) < 2:
+            continue
+        for other in times.columns:
+            if other == library:
+                continue
+            n_cross, measured = crossover(times.index, times[library], times[other])
+            largest = times.index.max()
+            rows.append({
+                'dataset': dataset, 'model': model, 'phase': phase, 'library': library, 'baseline': other,
+                'crossover_n': n_cross, 'measured': measured,
+                'faster_at_largest': bool(times.loc[largest, library] < times.loc[largest, other]),
+            })
+    return pd.DataFrame(rows)
+
+def plot_size_scaling(df, out_dir, phase='fit'):
+    """
+    Save a log-log plot of time vs. number of training examples per dataset and model; returns the file names.
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    df = df[df['phase'] == phase]
+    for (dataset, model), group in df.groupby(['dataset', 'model']):
+        fig, ax = plt.subplots(figsize=(6, 4))
+        for library, g in group.groupby('library'):
+            g = g.sort_values('n_examples_train')
+            line, = ax.plot(g['n_examples_train'], g['t_median'], 'o', label=library)
+            if len(g) > 1:
+                k, log_c, _ = fit_power_law(g['n_examples_train'], g['t_median'])
+                ax.plot(g['n_examples_train'], np.exp(log_c) * g['n_examples_train'] ** k, '-', color=line.get_color(),
+                        label='%s fit: n^%.2f' % (library, k))
+        ax.set_xscale('log')
+        ax.set_yscale('log')
+        ax.set_xlabel('training examples')
+        ax.set_ylabel('%s time (s)' % (phase))
+        ax.set_title('%s: %s' % (dataset, model))
+        ax.legend()
+        fig.tight_layout()
+        filename = os.path.join(out_dir, 'size-%s-%s-%s.png' % (dataset, model, phase))
+        fig.savefig(filename)
+        plt.close(fig)
+        files.append(filename)
+    return files
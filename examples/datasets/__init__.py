@@ -12,32 +12,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-# binary classification, libsvm
-from datasets.avazu import Avazu
-
-# binary classification, uci
-from datasets.higgs import Higgs
-
-# binary classification, kaggle
-from datasets.allstate import Allstate
-
-# binary classification, libsvm
-from datasets.epsilon import Epsilon
-
-# binary classification, libsvm
-from datasets.susy import Susy
-
-# binary classification, libsvm
-from datasets.mnist8m import Mnist8m
-
-# binary classification, kaggle
-from datasets.credit_card_fraud import CreditCardFraud
-
-# regression, kaggle
-from datasets.m5_forecasting import M5Forecasting
+import importlib
+
+# the loaders are imported on first access, so that `from datasets import Higgs` does not import
+# the dependencies of all the others (pandas, scikit-learn, requests, ...)
+_LOADERS = {
+    # binary classification, libsvm
+    'Avazu': 'datasets.avazu',
+    # binary classification, uci
+    'Higgs': 'datasets.higgs',
+    # binary classification, kaggle
+    'Allstate': 'datasets.allstate',
+    # binary classification, libsvm
+    'Epsilon': 'datasets.epsilon',
+    # binary classification, libsvm
+    'Susy': 'datasets.susy',
+    # binary classification, libsvm
+    'Mnist8m': 'datasets.mnist8m',
+    # binary classification, kaggle
+    'CreditCardFraud': 'datasets.credit_card_fraud',
+    # regression, kaggle
+    'M5Forecasting': 'datasets.m5_forecasting',
+    # synthetic stand-ins of the above, generated offline at any scale
+    'SyntheticHiggs': 'datasets.synthetic',
+    'SyntheticSusy': 'datasets.synthetic',
+    'SyntheticEpsilon': 'datasets.synthetic',
+    'SyntheticCreditCardFraud': 'datasets.synthetic',
+    'SyntheticMnist8m': 'datasets.synthetic',
+    'SyntheticAvazu': 'datasets.synthetic',
+    'SyntheticAllstate': 'datasets.synthetic',
+    'SyntheticM5Forecasting': 'datasets.synthetic',
+}
+
+__all__ = list(_LOADERS)
+
+def __getattr__(name):
+    if name not in _LOADERS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(_LOADERS[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 # to-add
 # rossmann (regression, kaggle
 # price-prediction (regression, kaggle)
 # santander (binary classificatin, kaggle)
-
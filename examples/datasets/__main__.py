@@ -0,0 +1,173 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Build the caches of several datasets concurrently, e.g. from the examples directory:
+#
+#   python -m datasets prepare Higgs Susy --jobs 4 --memory-budget 64
+
+import os
+import sys
+import time
+import argparse
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import datasets
+from datasets.dataset import Dataset
+from datasets.events import JsonLinesWriter
+from datasets.synthetic import SyntheticDataset
+
+def registry():
+    # the Dataset subclasses exported by the datasets package, by name; this imports all of them
+    return {name: getattr(datasets, name) for name in datasets.__all__}
+
+def total_memory_gb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024**3
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def _prepare(name, cache_dir, kwargs, log_file):
+    # runs in a worker process; the dataset's progress messages go to its log file
+    dataset = getattr(datasets, name)(cache_dir, **kwargs)
+    start = time.perf_counter()
+    with open(log_file, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            key = dataset.prepare()
+        except Exception:
+            traceback.print_exc()
+            raise
+    dataset.timings['total'] = time.perf_counter() - start
+    return key, dataset.timings, dataset.memory.get('preprocess', {})
+
+def prepare(names, cache_dir, jobs, budget_gb, kwargs):
+    # largest jobs first; a job is started when it fits into the memory left over by the
+    # running ones, and a job larger than the whole budget runs on its own
+    classes = registry()
+    pending = sorted(names, key=lambda name: -classes[name].prepare_memory_gb(**kwargs))
+    running, results, failed = {}, {}, []
+    log_dir = os.path.join(cache_dir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            in_use = sum(classes[name].prepare_memory_gb(**kwargs) for name in running.values())
+            for name in list(pending):
+                if len(running) >= jobs:
+                    break
+                need = classes[name].prepare_memory_gb(**kwargs)
+                if in_use + need <= budget_gb or not running:
+                    if need > budget_gb:
+                        print("Warning: %s needs about %.1f GB, more than the budget of %.1f GB" % (name, need, budget_gb))
+                    log_file = os.path.join(log_dir, '%s.log' % (name))
+                    print("Preparing %s (about %.1f GB, log: %s)" % (name, need, log_file))
+                    running[pool.submit(_prepare, name, cache_dir, kwargs, log_file)] = name
+                    pending.remove(name)
+                    in_use += need
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    key, timings, memory = future.result()
+                    results[name] = dict(timings, **memory)
+                    print("Prepared %s (cache %s) in %.1f s" % (name, key, timings['total']))
+                except Exception as e:
+                    failed.append(name)
+                    print("Failed to prepare %s: %r (see %s)" % (name, e, os.path.join(log_dir, '%s.log' % (name))))
+
+    return results, failed
+
+def print_timings(results):
+    phases = ['digest', 'download', 'import', 'preprocess', 'layout', 'write', 'total']
+    # the first column fits the longest dataset name and the table titles
+    first = '%%-%ds' % (max([len('preprocess (MiB)')] + [len(name) for name in results]))
+    print()
+    print((first + ' %11s' * len(phases)) % (('dataset',) + tuple(phases)))
+    for name, timings in results.items():
+        print((first + ' %11.1f' * len(phases)) % ((name,) + tuple(timings.get(phase, 0.0) for phase in phases)))
+    # the steps of preprocessing, e.g. parse and split, in their own table
+    steps = []
+    for timings in results.values():
+        steps += [k for k in timings if k not in phases + ['read'] and not k.startswith('mem_') and k not in steps]
+    if steps:
+        print()
+        print((first + ' %11s' * len(steps)) % (('preprocess (s)',) + tuple(steps)))
+        for name, timings in results.items():
+            print((first + ' %11.1f' * len(steps)) % ((name,) + tuple(timings.get(step, 0.0) for step in steps)))
+    # memory of the preprocessing phase, in MiB; absent if the cache existed already
+    memory = [k for k in ['mem_rss_peak', 'mem_rss_peak_increase', 'mem_rss_delta', 'mem_traced_peak_increase', 'mem_traced_delta']
+              if any(k in timings for timings in results.values())]
+    if memory:
+        print()
+        print((first + ' %24s' * len(memory)) % (('preprocess (MiB)',) + tuple(k[4:] for k in memory)))
+        for name, timings in results.items():
+            if memory[0] in timings:
+                print((first + ' %24.1f' * len(memory)) % ((name,) + tuple(timings.get(k, 0) / 1024**2 for k in memory)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m datasets', description='Manage the dataset cache')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='list the available datasets')
+
+    p = commands.add_parser('prepare', help='download and preprocess datasets into the cache')
+    p.add_argument('names', nargs='*', help='datasets to prepare (default: all real ones)')
+    p.add_argument('--cache-dir', default='cache-dir', help='cache directory (default: %(default)s)')
+    p.add_argument('--jobs', '-j', type=int, default=2, help='number of datasets prepared concurrently (default: %(default)s)')
+    p.add_argument('--memory-budget', type=float, default=None,
+                   help='memory in GB that concurrently prepared datasets may use (default: 80%% of physical memory)')
+    p.add_argument('--cache-format', choices=sorted(Dataset.CACHE_FORMATS), default='npy', help='cache format (default: %(default)s)')
+    p.add_argument('--trace-memory', action='store_true', help='trace the Python allocations of preprocessing with tracemalloc')
+    p.add_argument('--scale', type=float, default=None, help='number of rows of synthetic datasets, relative to the real ones (default: 1)')
+    p.add_argument('--events', default=None, help='append the phase events (start, end, bytes, rows) as JSON lines to this file')
+    p.add_argument('--profile-dir', default=None, help='profile every phase with cProfile and dump <dataset>-<phase>.prof files here')
+
+    args = parser.parse_args(argv)
+    classes = registry()
+
+    if args.command == 'list':
+        width = max(len(name) for name in classes)
+        for name, cls in sorted(classes.items()):
+            print("%-*s ~%.1f GB" % (width, name, cls.prepare_memory_gb()))
+        return 0
+
+    lookup = {name.lower(): name for name in classes}
+    names = []
+    # all real datasets by default
+    for name in args.names or sorted(name for name, cls in classes.items() if not issubclass(cls, SyntheticDataset)):
+        if name.lower() not in lookup:
+            parser.error("unknown dataset %s (choose from %s)" % (name, ', '.join(sorted(classes))))
+        names.append(lookup[name.lower()])
+
+    budget_gb = args.memory_budget
+    if budget_gb is None:
+        total = total_memory_gb()
+        budget_gb = 0.8 * total if total is not None else float('inf')
+
+    kwargs = {'cache_format': args.cache_format, 'trace_memory': args.trace_memory, 'profile_dir': args.profile_dir,
+              'hooks': [JsonLinesWriter(args.events)] if args.events else None}
+    if args.scale is not None:
+        if not all(issubclass(classes[name], SyntheticDataset) for name in names):
+            parser.error("--scale only applies to synthetic datasets")
+        kwargs['scale'] = args.scale
+    results, failed = prepare(names, args.cache_dir, max(1, args.jobs), budget_gb, kwargs)
+    print_timings(results)
+    if failed:
+        print("Failed: %s" % (', '.join(failed)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,22 +16,49 @@ from .dataset import Dataset
 import os
 import io
 import subprocess
-from scipy.sparse import save_npz, load_npz
 import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import MinMaxScaler, LabelEncoder, OneHotEncoder, normalize
-from scipy.sparse import save_npz, load_npz, csr_matrix
+from scipy.sparse import csr_matrix, hstack
 from zipfile import ZipFile
 
+LABEL_ENCODED_COLUMNS = ['Blind_Make', 'Blind_Model', 'Blind_Submodel', 'NVCat']
+ONE_HOT_COLUMNS = ['Cat1', 'Cat2', 'Cat3', 'Cat4', 'Cat5', 'Cat6', 'Cat7', 'Cat8', 'Cat9', 'Cat10', 'Cat11', 'Cat12']
+
+def _category_codes(values, train_index):
+    # codes of the categories seen in the training rows (in sorted order), -1 for unseen ones
+    import pandas as pd
+    values = values.astype(str)
+    categories = np.unique(values[train_index])
+    return pd.Categorical(values, categories=categories).codes, len(categories)
+
+def _one_hot(codes, n_categories):
+    # one-hot encode an (n_rows, n_columns) array of category codes into a CSR matrix,
+    # with the same min-max scaling as a dense encoding: a column that has a single
+    # category is constant in training and scales to 0, so only unseen categories
+    # (-1 after scaling) remain in it
+    offsets = np.concatenate([[0], np.cumsum(n_categories)[:-1]])
+    single = n_categories == 1
+    valid = np.where(single, codes < 0, codes >= 0)
+    values = np.broadcast_to(np.where(single, -1.0, 1.0).astype(np.float32), codes.shape)
+    indices = np.where(single, 0, codes) + offsets
+    indptr = np.concatenate([[0], np.cumsum(valid.sum(axis=1))])
+    return csr_matrix((values[valid], indices[valid], indptr), shape=(codes.shape[0], n_categories.sum()))
+
 class Allstate(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['allstate.X_train.npy',
-                 'allstate.X_test.npy',
-                 'allstate.y_train.npy',
-                 'allstate.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 24
+
+    IMPORTS = ['pandas', 'sklearn.model_selection', 'sklearn.preprocessing']
+
+    # rows scaled, encoded and written at a time
+    BLOCK_ROWS = 65536
+
+    def __init__(self, cache_dir, test_size=0.3, random_state=42, norm='l1', sparse=False, **kwargs):
+        files = ['allstate.X_train',
+                 'allstate.X_test',
+                 'allstate.y_train',
+                 'allstate.y_test']
+        params = {'test_size': test_size, 'random_state': random_state, 'norm': norm, 'sparse': sparse}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_file = os.path.join(self.working_dir, 'ClaimPredictionChallenge.zip')
      
     def download_raw_data(self):
@@ -46,97 +73,118 @@ class Allstate(Dataset):
                 """
             ) 
     def preprocess_data(self):
-
-        with ZipFile(self.raw_file, 'r') as a:
-            df = pd.read_csv(io.BytesIO(a.read('train_set.zip')), compression='zip')
-        
-        df.drop(['Row_ID'],axis=1,inplace=True)
-        df.replace('?', np.NaN, inplace=True)
+        import pandas as pd
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import MinMaxScaler
+
+        with self._timed('decompress') as event, ZipFile(self.raw_file, 'r') as a:
+            raw = a.read('train_set.zip')
+            event.bytes = len(raw)
+        with self._timed('parse') as event:
+            df = pd.read_csv(io.BytesIO(raw), compression='zip')
+            event.bytes, event.rows = len(raw), df.shape[0]
+        del raw
+
+        df.drop(['Row_ID'], axis=1, inplace=True)
+        df.replace('?', np.nan, inplace=True)
         df.fillna(-1, inplace=True)
 
-        df_Y = df[['Claim_Amount']]
-        df_X = df.drop(['Claim_Amount'],axis=1)
-
-        indices = range(df_X.shape[0])
-        X_train, X_test, y_train, y_test  = train_test_split(df_X, df_Y, test_size=0.3, shuffle=True, random_state=42)
-    
-        X_train = X_train.reset_index().copy()
-        X_test = X_test.reset_index().copy()
-     
-        for col in ['Blind_Make', 'Blind_Model', 'Blind_Submodel', 'NVCat']:
-            X_train[col] = X_train[col].astype(str)
-            X_test[col] = X_test[col].astype(str)
-            
-            le = LabelEncoder()
-
-            # fit label encoder
-            le.fit(X_train[col])
-
-            # extract dictionary mapping from label encoder
-            le_dict = dict(zip(le.classes_, le.transform(le.classes_)))
-
-            # replace categories with labels (assign label -1 if not in dict)
-            X_train[col] = X_train[col].map(lambda x: le_dict.get(x, -1))
-            X_test[col] = X_test[col].map(lambda x: le_dict.get(x, -1))
-
-        categoricalColumns = ['Cat1', 'Cat2', 'Cat3', 'Cat4', 'Cat5', 'Cat6', 'Cat7', 'Cat8', 'Cat9', 'Cat10', 'Cat11', 'Cat12']
-        for col in categoricalColumns:
-            X_train[col] = X_train[col].astype(str)
-            X_test[col] = X_test[col].astype(str)
-
-            oh = OneHotEncoder(handle_unknown='ignore')
-            tmp_train = oh.fit_transform(X_train[col].values.reshape(-1,1)).toarray()
-            tmp_test = oh.transform(X_test[col].values.reshape(-1,1)).toarray()
-
-            assert(tmp_train.shape[1] == tmp_test.shape[1])
-
-            X_train = X_train.drop(col,axis=1)
-            X_test = X_test.drop(col,axis=1)
-
-            new_cols = [col + '-' + str(int(i)) for i in range(tmp_train.shape[1])]
-
-            tmp_train = pd.DataFrame(tmp_train, columns=new_cols)
-            tmp_test  = pd.DataFrame(tmp_test,  columns=new_cols)
-
-            X_train = pd.concat([X_train, tmp_train],axis=1)
-            X_test  = pd.concat([X_test,  tmp_test],axis=1)
-
-        for col in ['Calendar_Year']:
-            X_train['Vehicle_Age'] = X_train['Calendar_Year'] - X_train['Model_Year']
-            X_test['Vehicle_Age'] = X_test['Calendar_Year'] - X_test['Model_Year']
-
-        X_train.drop(['Calendar_Year'], axis=1, inplace=True)
-        X_test.drop(['Calendar_Year'], axis=1, inplace=True)
-
-        X_train = np.ascontiguousarray(X_train.values, dtype=np.float32)
-        X_test = np.ascontiguousarray(X_test.values, dtype=np.float32)
-
-        min_max_scaler = MinMaxScaler()
-        min_max_scaler.fit(X_train)
-        X_train = min_max_scaler.transform(X_train)
-        X_test = min_max_scaler.transform(X_test)
-
-        # normalize and cast array to float32
-        X_train = normalize(X_train, axis=1, norm='l1')
-        X_test = normalize(X_test, axis=1, norm='l1')
-
-        y_train = y_train.values.ravel()
-        y_test = y_test.values.ravel()
-
-        y_train = (y_train > 0).astype(np.float32)
-        y_test = (y_test > 0).astype(np.float32)
-
-        return X_train, X_test, y_train, y_test
+        y = (df.pop('Claim_Amount').values > 0).astype(np.float32)
+
+        with self._timed('split') as event:
+            train_index, test_index = train_test_split(np.arange(df.shape[0]), test_size=self.params['test_size'], shuffle=True, random_state=self.params['random_state'])
+            event.rows = df.shape[0]
+
+        with self._timed('encode') as event:
+            # dense block: original row index, numeric and label encoded columns, vehicle age
+            dense_cols = [col for col in df.columns if col not in ONE_HOT_COLUMNS + ['Calendar_Year']]
+            dense = self._allocate_array('allstate.dense', (df.shape[0], len(dense_cols) + 2), np.float32, scratch=True)
+            dense[:, 0] = np.arange(df.shape[0])
+            for j, col in enumerate(dense_cols):
+                if col in LABEL_ENCODED_COLUMNS:
+                    dense[:, j+1], _ = _category_codes(df[col].values, train_index)
+                else:
+                    dense[:, j+1] = df[col].values
+            dense[:, -1] = df['Calendar_Year'].values - df['Model_Year'].values
+
+            # sparse block: one-hot encoded categorical columns
+            codes = self._allocate_array('allstate.codes', (df.shape[0], len(ONE_HOT_COLUMNS)), np.int32, scratch=True)
+            n_categories = np.empty(len(ONE_HOT_COLUMNS), dtype=np.int64)
+            for j, col in enumerate(ONE_HOT_COLUMNS):
+                codes[:, j], n_categories[j] = _category_codes(df[col].values, train_index)
+            event.rows = df.shape[0]
+        del df
+
+        with self._timed('scale') as event:
+            # fitted on the training rows block by block, and applied as the rows are assembled
+            scaler = MinMaxScaler()
+            for start in range(0, len(train_index), self.BLOCK_ROWS):
+                scaler.partial_fit(dense[train_index[start:start+self.BLOCK_ROWS]])
+            event.rows = len(train_index)
+
+        with self._timed('assemble') as event:
+            X_train = self._assemble(self.files[0], dense, codes, train_index, n_categories, scaler)
+            X_test = self._assemble(self.files[1], dense, codes, test_index, n_categories, scaler)
+            event.rows = X_train.shape[0] + X_test.shape[0]
+
+        return X_train, X_test, y[train_index], y[test_index]
+
+    def _assemble_block(self, dense, codes, rows, n_categories, scaler):
+        # columns are ordered as: dense block, one-hot block, vehicle age
+        from sklearn.preprocessing import normalize
+        block = scaler.transform(dense[rows])
+        one_hot = _one_hot(codes[rows], n_categories)
+        if self.params['sparse']:
+            X = hstack([csr_matrix(block[:, :-1]), one_hot, csr_matrix(block[:, -1:])], format='csr', dtype=np.float32)
+        else:
+            n_dense = block.shape[1] - 1
+            X = np.zeros((block.shape[0], n_dense + one_hot.shape[1] + 1), dtype=np.float32)
+            X[:, :n_dense] = block[:, :-1]
+            X[:, -1] = block[:, -1]
+            X[np.repeat(np.arange(one_hot.shape[0]), np.diff(one_hot.indptr)), n_dense + one_hot.indices] = one_hot.data
+        if self.params['norm'] is not None:
+            X = normalize(X, axis=1, norm=self.params['norm'], copy=False)
+        return X
+
+    def _assemble(self, name, dense, codes, index, n_categories, scaler):
+        """
+        Scale, encode and normalize the rows `index` block by block into memory-mapped arrays
+        in the cache entry, so that neither the features nor their split copies are held in memory.
+        """
+
+        width = dense.shape[1] + int(n_categories.sum())
+        starts = range(0, len(index), self.BLOCK_ROWS)
+        if not self.params['sparse']:
+            X = self._allocate_array(name, (len(index), width), np.float32)
+            for start in starts:
+                X[start:start+self.BLOCK_ROWS] = self._assemble_block(dense, codes, index[start:start+self.BLOCK_ROWS], n_categories, scaler)
+            return X
+        # two passes: the number of non-zeros of every row, then the rows themselves
+        nnz = np.concatenate([[0]] + [np.diff(self._assemble_block(dense, codes, index[start:start+self.BLOCK_ROWS], n_categories, scaler).indptr)
+                                      for start in starts])
+        index_dtype = np.int32 if nnz.sum() < np.iinfo(np.int32).max else np.int64
+        indptr = self._allocate_array(name + '.indptr', (len(index) + 1,), index_dtype)
+        np.cumsum(nnz, out=indptr)
+        data = self._allocate_array(name + '.data', (indptr[-1],), np.float32)
+        indices = self._allocate_array(name + '.indices', (indptr[-1],), index_dtype)
+        for start in starts:
+            stop = min(start + self.BLOCK_ROWS, len(index))
+            block = self._assemble_block(dense, codes, index[start:stop], n_categories, scaler)
+            data[indptr[start]:indptr[stop]] = block.data
+            indices[indptr[start]:indptr[stop]] = block.indices
+        X = csr_matrix((len(index), width), dtype=np.float32)
+        X.data, X.indices, X.indptr = data, indices, indptr
+        return X
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        np.save(os.path.join(self.working_dir, 'allstate.X_train'), X_train)
-        np.save(os.path.join(self.working_dir, 'allstate.X_test'), X_test)
-        np.save(os.path.join(self.working_dir, 'allstate.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'allstate.y_test'), y_test)
-
-    def read_cache_data(self):
-        X_train = np.load(os.path.join(self.working_dir, 'allstate.X_train.npy'))
-        X_test = np.load(os.path.join(self.working_dir, 'allstate.X_test.npy'))
-        y_train = np.load(os.path.join(self.working_dir, 'allstate.y_train.npy'))
-        y_test = np.load(os.path.join(self.working_dir, 'allstate.y_test.npy'))
+        self._save_array('allstate.X_train', X_train)
+        self._save_array('allstate.X_test', X_test)
+        self._save_array('allstate.y_train', y_train)
+        self._save_array('allstate.y_test', y_test)
+
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('allstate.X_train', mmap)
+        X_test = self._load_array('allstate.X_test', mmap)
+        y_train = self._load_array('allstate.y_train', mmap)
+        y_test = self._load_array('allstate.y_test', mmap)
         return X_train, X_test, y_train, y_test
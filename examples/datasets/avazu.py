@@ -13,43 +13,50 @@
 # limitations under the License.
 
 from .dataset import Dataset
+from .ingest import read_svmlight
 import os
-from sklearn.datasets import load_svmlight_file
-from scipy.sparse import save_npz, load_npz
-import numpy as np
 
 class Avazu(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['avazu.X_train.npz', 
-                 'avazu.X_test.npz',
-                 'avazu.y_train.npy',
-                 'avazu.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 8
+
+    IMPORTS = ['sklearn.datasets']
+
+    def __init__(self, cache_dir, n_features=1_000_000, **kwargs):
+        files = ['avazu.X_train', 
+                 'avazu.X_test',
+                 'avazu.y_train',
+                 'avazu.y_test']
+        params = {'n_features': n_features}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_train = os.path.join(self.working_dir, 'avazu-app.tr.bz2')
         self.raw_test = os.path.join(self.working_dir, 'avazu-app.val.bz2')
 
+    def raw_files(self):
+        return [self.raw_train, self.raw_test]
+
     def download_raw_data(self):
         self._download_file('https://www.csie.ntu.edu.tw/~cjlin/libsvmtools/datasets/binary/avazu-app.tr.bz2', self.raw_train)
         self._download_file('https://www.csie.ntu.edu.tw/~cjlin/libsvmtools/datasets/binary/avazu-app.val.bz2', self.raw_test)
 
     def preprocess_data(self):
-        X_train, y_train = load_svmlight_file(self.raw_train, n_features=1_000_000)
-        X_test, y_test = load_svmlight_file(self.raw_test, n_features=1_000_000)
+        with self._timed('parse') as event:
+            X_train, y_train = read_svmlight(self.raw_train, n_features=self.params['n_features'])
+            event.bytes, event.rows = self._files_bytes([self.raw_train]), X_train.shape[0]
+        with self._timed('parse') as event:
+            X_test, y_test = read_svmlight(self.raw_test, n_features=self.params['n_features'])
+            event.bytes, event.rows = self._files_bytes([self.raw_test]), X_test.shape[0]
         return X_train, X_test, y_train, y_test
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        save_npz(os.path.join(self.working_dir, 'avazu.X_train'), X_train, compressed=False)
-        save_npz(os.path.join(self.working_dir, 'avazu.X_test'), X_test,  compressed=False)
-        np.save(os.path.join(self.working_dir, 'avazu.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'avazu.y_test'), y_test)
-
-    def read_cache_data(self):
-        X_train = load_npz(os.path.join(self.working_dir, 'avazu.X_train.npz'))
-        X_test  = load_npz(os.path.join(self.working_dir, 'avazu.X_test.npz'))
-        y_train = np.load(os.path.join(self.working_dir, 'avazu.y_train.npy'))
-        y_test  = np.load(os.path.join(self.working_dir, 'avazu.y_test.npy'))
+        self._save_array('avazu.X_train', X_train)
+        self._save_array('avazu.X_test', X_test)
+        self._save_array('avazu.y_train', y_train)
+        self._save_array('avazu.y_test', y_test)
+
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('avazu.X_train', mmap)
+        X_test = self._load_array('avazu.X_test', mmap)
+        y_train = self._load_array('avazu.y_train', mmap)
+        y_test = self._load_array('avazu.y_test', mmap)
         return X_train, X_test, y_train, y_test
-
-
-           
@@ -0,0 +1,152 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import zlib
+import struct
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# File layout: MAGIC, the length of the JSON header as a little-endian uint64,
+# the JSON header (dtype, shape, order, codec, raw block size and the compressed
+# size of every block), followed by the compressed blocks.
+MAGIC = b'SNAPBLK1'
+EXTENSION = '.blk'
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+def _lz4():
+    import lz4.frame
+    return lz4.frame.compress, lz4.frame.decompress
+
+def _zstd():
+    import zstandard
+    # one (de)compressor per call, as they are not thread-safe
+    return (lambda b: zstandard.ZstdCompressor(level=1).compress(b),
+            lambda b: zstandard.ZstdDecompressor().decompress(b))
+
+def _zlib():
+    return (lambda b: zlib.compress(b, 1)), zlib.decompress
+
+# codecs that release the GIL, fastest first; zlib is always available
+CODECS = {'lz4': _lz4, 'zstd': _zstd, 'zlib': _zlib}
+
+def get_codec(name):
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError("Unknown codec: %s" % (name))
+    except ImportError:
+        raise ImportError("Codec %s is not installed; install the %s package or use codec='zlib'" %
+                          (name, 'lz4' if name == 'lz4' else 'zstandard'))
+
+def default_codec():
+    for name in CODECS:
+        try:
+            get_codec(name)
+            return name
+        except ImportError:
+            pass
+
+def _as_bytes(a):
+    # flat byte view of `a` in its storage order, copying only if it is not contiguous
+    fortran = a.ndim > 1 and a.flags.f_contiguous and not a.flags.c_contiguous
+    a = np.ascontiguousarray(a.T if fortran else a)
+    return a.reshape(-1).view(np.uint8), fortran
+
+def save_blocked(filename, a, codec=None, block_size=DEFAULT_BLOCK_SIZE, n_jobs=None):
+    """
+    Write the dense array `a` to `filename` as independently compressed blocks of `block_size` bytes.
+    """
+
+    a = np.asarray(a)
+    if a.dtype.hasobject:
+        raise ValueError("Cannot store arrays of dtype object")
+    if codec is None:
+        codec = default_codec()
+    compress, _ = get_codec(codec)
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    buf, fortran = _as_bytes(a)
+    sizes = []
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        # reserve room for the header, which is only complete once all blocks are written
+        n_blocks = -(-len(buf) // block_size)
+        header_size = len(json.dumps(_header(a, fortran, codec, block_size, [2**63] * n_blocks)))
+        f.seek(len(MAGIC) + 8 + header_size)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            for start in range(0, len(buf), block_size):
+                pending.append(pool.submit(compress, buf[start:start+block_size]))
+                if len(pending) >= 2 * n_jobs:
+                    sizes.append(f.write(pending.popleft().result()))
+            while pending:
+                sizes.append(f.write(pending.popleft().result()))
+        header = json.dumps(_header(a, fortran, codec, block_size, sizes)).ljust(header_size).encode()
+        f.seek(0)
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+    os.replace(tmp, filename)
+
+def _header(a, fortran, codec, block_size, sizes):
+    return {'dtype': a.dtype.str, 'shape': list(a.shape), 'fortran_order': fortran,
+            'codec': codec, 'block_size': block_size, 'blocks': sizes}
+
+def read_header(filename):
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a block-compressed array file" % (filename))
+        n = struct.unpack('<Q', f.read(8))[0]
+        return json.loads(f.read(n)), len(MAGIC) + 8 + n
+
+def _read_block(fd, offset, size, decompress, out):
+    raw = decompress(os.pread(fd, size, offset))
+    if len(raw) != len(out):
+        raise RuntimeError("Corrupt block at offset %d: %d bytes instead of %d" % (offset, len(raw), len(out)))
+    out[:] = np.frombuffer(raw, dtype=np.uint8)
+
+def load_blocked(filename, n_jobs=None):
+    """
+    Read an array written by `save_blocked`, decompressing its blocks in `n_jobs` threads
+    straight into the preallocated result.
+    """
+
+    header, offset = read_header(filename)
+    _, decompress = get_codec(header['codec'])
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    shape = tuple(header['shape'])
+    a = np.empty(shape[::-1] if header['fortran_order'] else shape, dtype=np.dtype(header['dtype']))
+    buf = a.reshape(-1).view(np.uint8)
+    block_size = header['block_size']
+
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = []
+            for i, size in enumerate(header['blocks']):
+                out = buf[i*block_size:(i+1)*block_size]
+                futures.append(pool.submit(_read_block, fd, offset, size, decompress, out))
+                offset += size
+            for future in futures:
+                future.result()
+    finally:
+        os.close(fd)
+
+    return a.T if header['fortran_order'] else a
@@ -0,0 +1,151 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# bump whenever the on-disk layout of cache entries changes
+CACHE_VERSION = 3
+
+def cache_key(**fields):
+    blob = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+def dir_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+class CacheManifest():
+    """
+    Index of all preprocessed dataset variants stored below a cache directory.
+
+    Each entry maps `<dataset>/<key>` to the preprocessing parameters and raw file
+    digests it was built from, its size on disk and the time it was last used.
+    The manifest also memoizes the sha256 digests of raw files. Updates are made
+    under an exclusive file lock (where available) and written atomically, so
+    several processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.filename = os.path.join(cache_dir, 'manifest.json')
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.filename + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield self._read()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self):
+        if not os.path.isfile(self.filename):
+            return {'version': CACHE_VERSION, 'entries': {}, 'digests': {}}
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def _write(self, manifest):
+        tmp = '%s.tmp-%d' % (self.filename, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.filename)
+
+    def digest(self, filename):
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+        memo = self._read()['digests'].get(filename)
+        if memo is not None and memo['size'] == st.st_size and memo['mtime'] == st.st_mtime:
+            return memo['sha256']
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                h.update(chunk)
+        with self._locked() as manifest:
+            manifest['digests'][filename] = {'size': st.st_size, 'mtime': st.st_mtime, 'sha256': h.hexdigest()}
+            self._write(manifest)
+        return h.hexdigest()
+
+    def find(self, dataset, key=None, params=None):
+        # look up an entry by key, or else the most recently used one with matching params
+        entries = self._read()['entries']
+        if key is not None:
+            entry = entries.get('%s/%s' % (dataset, key))
+            return key if entry is not None else None
+        candidates = [(e['last_used'], e['key']) for e in entries.values()
+                      if e['dataset'] == dataset and e['params'] == params and e['version'] == CACHE_VERSION]
+        return max(candidates)[1] if candidates else None
+
+    def touch(self, dataset, key):
+        with self._locked() as manifest:
+            entry = manifest['entries'].get('%s/%s' % (dataset, key))
+            if entry is not None:
+                entry['last_used'] = time.time()
+                self._write(manifest)
+
+    def register(self, dataset, key, path, params, raw):
+        now = time.time()
+        with self._locked() as manifest:
+            manifest['entries']['%s/%s' % (dataset, key)] = {
+                'dataset': dataset,
+                'key': key,
+                'path': os.path.relpath(path, self.cache_dir),
+                'params': params,
+                'raw': raw,
+                'bytes': dir_size(path),
+                'created': now,
+                'last_used': now,
+                'version': CACHE_VERSION,
+            }
+            self._write(manifest)
+
+    def remove(self, dataset, key):
+        with self._locked() as manifest:
+            entry = manifest['entries'].pop('%s/%s' % (dataset, key), None)
+            if entry is not None:
+                shutil.rmtree(os.path.join(self.cache_dir, entry['path']), ignore_errors=True)
+                self._write(manifest)
+
+    def evict(self, max_bytes, keep=()):
+        """
+        Remove least recently used entries until the cache fits into `max_bytes`.
+        """
+        with self._locked() as manifest:
+            entries = manifest['entries']
+            total = sum(e['bytes'] for e in entries.values())
+            for name, entry in sorted(entries.items(), key=lambda item: item[1]['last_used']):
+                if total <= max_bytes:
+                    break
+                if name in keep:
+                    continue
+                print("Evicting cached dataset variant %s (%.1f MB)" % (name, entry['bytes']/1024/1024))
+                shutil.rmtree(os.path.join(self.cache_dir, entry['path']), ignore_errors=True)
+                total -= entry['bytes']
+                del entries[name]
+            self._write(manifest)
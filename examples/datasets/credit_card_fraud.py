@@ -16,20 +16,23 @@ from .dataset import Dataset
 import os
 import io
 import subprocess
-import numpy as np
-import pandas as pd
-from sklearn.model_selection import StratifiedShuffleSplit
-from sklearn.preprocessing import StandardScaler, normalize
 from zipfile import ZipFile
 
 class CreditCardFraud(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['creditcard.X_train.npy',
-                 'creditcard.X_test.npy',
-                 'creditcard.y_train.npy',
-                 'creditcard.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 1
+
+    SUPPORTS_RAW_BATCHES = True
+
+    IMPORTS = Dataset.IMPORTS + ['pandas', 'sklearn.preprocessing']
+
+    def __init__(self, cache_dir, test_size=0.25, random_state=42, norm='l1', **kwargs):
+        files = ['creditcard.X_train',
+                 'creditcard.X_test',
+                 'creditcard.y_train',
+                 'creditcard.y_test']
+        params = {'test_size': test_size, 'random_state': random_state, 'norm': norm}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_file = os.path.join(self.working_dir, 'creditcardfraud.zip')
      
     def download_raw_data(self):
@@ -42,37 +45,62 @@ class CreditCardFraud(Dataset):
                 "Could not download dataset from Kaggle. Please ensure you have installed a Kaggle API token: https://www.kaggle.com/docs/api"
             ) 
 
-    def preprocess_data(self):
+    def _read_raw_chunks(self, batch_size):
+        import pandas as pd
+        with ZipFile(self.raw_file, 'r') as a, a.open('creditcard.csv') as f:
+            with pd.read_csv(f, chunksize=batch_size) as reader:
+                for chunk in reader:
+                    data_matrix = chunk.values
+                    yield data_matrix[:, 1:29], data_matrix[:, 30]
 
-        with ZipFile(self.raw_file, 'r') as a:
-            df = pd.read_csv(io.BytesIO(a.read('creditcard.csv')))
-        
-        df.iloc[:, 1:29] = StandardScaler().fit_transform(df.iloc[:, 1:29])
+    def _iter_raw_batches(self, batch_size):
+        # batches in the order of the file, i.e. by time; the features are standardized with
+        # statistics of the whole dataset, as in the cache, so a first pass computes those
+        from sklearn.preprocessing import StandardScaler, normalize
+        scaler = StandardScaler()
+        for X, y in self._read_raw_chunks(batch_size):
+            scaler.partial_fit(X)
+        for X, y in self._read_raw_chunks(batch_size):
+            X = scaler.transform(X)
+            if self.params['norm'] is not None:
+                X = normalize(X, norm=self.params['norm'])
+            yield X, y
 
-        data_matrix = df.values
-        X = data_matrix[:, 1:29]
-        y = data_matrix[:, 30]
+    def preprocess_data(self):
+        import pandas as pd
+        from sklearn.preprocessing import StandardScaler, normalize
 
-        # Normalize the data
-        X = normalize(X, norm="l1")
+        with self._timed('decompress') as event, ZipFile(self.raw_file, 'r') as a:
+            raw = a.read('creditcard.csv')
+            event.bytes = len(raw)
+        with self._timed('parse') as event:
+            df = pd.read_csv(io.BytesIO(raw))
+            event.bytes, event.rows = len(raw), df.shape[0]
+        del raw
 
-        stratSplit = StratifiedShuffleSplit(n_splits=1, test_size=0.25, random_state=42)
+        with self._timed('scale') as event:
+            df.iloc[:, 1:29] = StandardScaler().fit_transform(df.iloc[:, 1:29])
 
-        for train_index, test_index in stratSplit.split(X, y):
-            X_train, X_test = X[train_index], X[test_index]
-            y_train, y_test = y[train_index], y[test_index]
+            data_matrix = df.values
+            X = data_matrix[:, 1:29]
+            y = data_matrix[:, 30]
 
-        return X_train, X_test, y_train, y_test
+            # Normalize the data
+            if self.params['norm'] is not None:
+                X = normalize(X, norm=self.params['norm'])
+            event.rows = X.shape[0]
+
+        return self._split(X, y, self.params['test_size'], self.params['random_state'], stratify=True)
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        np.save(os.path.join(self.working_dir, 'creditcard.X_train'), X_train)
-        np.save(os.path.join(self.working_dir, 'creditcard.X_test'), X_test)
-        np.save(os.path.join(self.working_dir, 'creditcard.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'creditcard.y_test'), y_test)
-
-    def read_cache_data(self):
-        X_train = np.load(os.path.join(self.working_dir, 'creditcard.X_train.npy'))
-        X_test = np.load(os.path.join(self.working_dir, 'creditcard.X_test.npy'))
-        y_train = np.load(os.path.join(self.working_dir, 'creditcard.y_train.npy'))
-        y_test = np.load(os.path.join(self.working_dir, 'creditcard.y_test.npy'))
+        self._save_array('creditcard.X_train', X_train)
+        self._save_array('creditcard.X_test', X_test)
+        self._save_array('creditcard.y_train', y_train)
+        self._save_array('creditcard.y_test', y_test)
+
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('creditcard.X_train', mmap)
+        X_test = self._load_array('creditcard.X_test', mmap)
+        y_train = self._load_array('creditcard.y_train', mmap)
+        y_test = self._load_array('creditcard.y_test', mmap)
         return X_train, X_test, y_train, y_test
@@ -1,67 +1,654 @@
+from .cache import CacheManifest, CACHE_VERSION, cache_key
+from .blocked import save_blocked, load_blocked
+from .memory import MemoryMonitor
+from .events import HOOKS, PhaseEvent, PhaseProfiler
 import os
-import requests
-from tqdm.notebook import tqdm
+import json
+import importlib
+import time
+import shutil
+import threading
+import numpy as np
+from scipy.sparse import issparse, csr_matrix
+from contextlib import contextmanager
 
 class Dataset():
 
-    def __init__(self, cache_dir, name, files):
+    CACHE_FORMATS = {'npy': '.npy', 'blocked': '.blk'}
+
+    # rough peak memory needed to build the cache, used to schedule `python -m datasets prepare`
+    PREPARE_MEMORY_GB = 1
+
+    # libraries used by preprocessing; they are only imported when the cache is built, and
+    # then before preprocessing, so that their import is not part of its timings and memory
+    IMPORTS = ['sklearn.model_selection']
+
+    # whether `iter_batches(source='raw')` can stream the raw data (see `_iter_raw_batches`)
+    SUPPORTS_RAW_BATCHES = False
+
+    # labels with at most this many distinct values are treated as classes when subsampling
+    MAX_STRATA = 1024
+
+    # options of the base class that change the cached data, with their defaults
+    OPTIONS = {'cache_format': 'npy', 'dtype': 'float32', 'order': 'C', 'label_dtype': 'float32'}
+
+    def __init__(self, cache_dir, name, files, params=None, max_cache_bytes=None, cache_format='npy', codec=None,
+                 dtype=np.float32, order='C', label_dtype=np.float32, trace_memory=False, hooks=None, profile_dir=None):
+        if cache_format not in self.CACHE_FORMATS:
+            raise ValueError("Unknown cache format: %s" % (cache_format))
+        if order not in ['C', 'F', None]:
+            raise ValueError("Unknown memory layout: %s" % (order))
         self.name = name
         self.cache_dir = cache_dir
         self.working_dir = os.path.join(self.cache_dir, self.name)
         self.files = files
+        self.cache_format = cache_format
+        self.codec = codec
+        # dtype and memory layout of the cached features and labels; None keeps them as preprocessed
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.order = order
+        self.label_dtype = None if label_dtype is None else np.dtype(label_dtype)
+        # preprocessing parameters; every distinct set is cached as its own variant. The
+        # base class options are only recorded when they differ from their defaults, so
+        # that the keys of default variants do not depend on them
+        params = dict(params or {})
+        options = {'cache_format': cache_format, 'order': order,
+                   'dtype': None if dtype is None else self.dtype.name,
+                   'label_dtype': None if label_dtype is None else self.label_dtype.name}
+        params.update({k: v for k, v in options.items() if v != self.OPTIONS[k]})
+        self.params = json.loads(json.dumps(params, sort_keys=True, default=str))
+        self.max_cache_bytes = max_cache_bytes
+        self.manifest = CacheManifest(self.cache_dir)
+        self.cache_path = None
+        # memory-mapped arrays created by `_allocate_array` while building the cache
+        self._allocated = {}
+        # wall-clock seconds spent in each phase of building or reading the cache
+        self.timings = {}
+        # peak and delta memory of preprocessing, with the Python heap traced if `trace_memory` is set
+        self.trace_memory = trace_memory
+        self.memory = {}
+        # called with a `PhaseEvent` when each phase starts and ends (see `datasets.events`)
+        self.hooks = list(hooks or [])
+        # with a directory, every phase is profiled with cProfile and dumped there
+        self._profiler = PhaseProfiler(profile_dir) if profile_dir is not None else None
+        self._phases = []
 
     def __check_cache_exist(self):
         files_exist = True
         for file in self.files:
-            files_exist &= os.path.isfile(os.path.join(self.working_dir, file))
+            files_exist &= self._array_exists(file)
         return files_exist
 
-    def _download_file(self, url, filename):
-        print("Downloading file: %s" % (url))
-        r = requests.get(url, allow_redirects=True, stream=True)
-        tot_size = int(r.headers.get('content-length', 0))
-        if os.path.isfile(filename) and os.stat(filename).st_size == tot_size:
-            print("File %s with correct size exists; skipping download" % (filename))
+    @classmethod
+    def prepare_memory_gb(cls, **kwargs):
+        # peak memory of building the cache with the given constructor arguments, in GB;
+        # PREPARE_MEMORY_GB unless it depends on them
+        return cls.PREPARE_MEMORY_GB
+
+    def raw_files(self):
+        return [self.raw_file]
+
+    def _raw_digests(self):
+        # None if the raw data has not been downloaded
+        if not all(os.path.isfile(file) for file in self.raw_files()):
+            return None
+        return [self.manifest.digest(file) for file in self.raw_files()]
+
+    def _cache_key(self, raw):
+        return cache_key(dataset=self.name, files=self.files, params=self.params, raw=raw, version=CACHE_VERSION)
+
+    def _find_cache(self, raw):
+        # without the raw data, fall back to the most recent variant built with the same parameters
+        if raw is None:
+            key = self.manifest.find(self.name, params=self.params)
+        else:
+            key = self.manifest.find(self.name, key=self._cache_key(raw))
+        if key is None:
+            return None
+        self.cache_path = os.path.join(self.working_dir, key)
+        if not self.__check_cache_exist():
+            self.manifest.remove(self.name, key)
+            return None
+        return key
+
+    def _array_files(self, name):
+        path = os.path.join(self.cache_path, name)
+        ext = self.CACHE_FORMATS[self.cache_format]
+        if os.path.isfile(path + ext):
+            return [path + ext]
+        return [path + '.%s%s' % (c, ext) for c in ['data', 'indices', 'indptr', 'shape']]
+
+    def _array_exists(self, name):
+        return all(os.path.isfile(file) for file in self._array_files(name))
+
+    def _save_component(self, path, a):
+        m = self._allocated.get(path)
+        if m is not None and a.__array_interface__ == m.__array_interface__:
+            # preprocessing has written this array to its cache file already
+            m.flush()
             return
-        pb = tqdm(total=tot_size, unit='iB', unit_scale=True)
-        with open(filename, 'wb') as f:
-            for data in r.iter_content(1024):
-                pb.update(len(data))
-                f.write(data)
-        pb.close()
+        if self.cache_format == 'blocked':
+            save_blocked(path + '.blk', a, codec=self.codec)
+        else:
+            np.save(path + '.npy', a)
+
+    def _load_component(self, path, mmap):
+        # block-compressed files cannot be memory-mapped and are always decompressed into memory
+        if self.cache_format == 'blocked':
+            return load_blocked(path + '.blk')
+        return np.load(path + '.npy', mmap_mode='r' if mmap else None)
+
+    def _save_array(self, name, a):
+        # dense arrays are stored as a single file, sparse matrices as their raw
+        # CSR component arrays so that both can be memory-mapped on read
+        path = os.path.join(self.cache_path, name)
+        if issparse(a):
+            a = csr_matrix(a)
+            self._save_component(path + '.data', a.data)
+            self._save_component(path + '.indices', a.indices)
+            self._save_component(path + '.indptr', a.indptr)
+            self._save_component(path + '.shape', np.array(a.shape, dtype=np.int64))
+        else:
+            self._save_component(path, a)
+
+    def _load_array(self, name, mmap=False):
+        path = os.path.join(self.cache_path, name)
+        if len(self._array_files(name)) == 1:
+            return self._load_component(path, mmap)
+        data = self._load_component(path + '.data', mmap)
+        indices = self._load_component(path + '.indices', mmap)
+        indptr = self._load_component(path + '.indptr', mmap)
+        shape = tuple(self._load_component(path + '.shape', False))
+        return csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+    def _apply_layout(self, X, y):
+        # convert to the cached dtype and layout once, so that estimators do not copy on fit
+        # (arrays that already conform are passed through as they are, as they may be memory maps)
+        if issparse(X):
+            X = csr_matrix(X, dtype=self.dtype, copy=False)
+            if not X.has_sorted_indices:
+                X.sort_indices()
+        else:
+            if not isinstance(X, np.ndarray):
+                X = np.asarray(X)
+            if self.dtype is not None and X.dtype != self.dtype:
+                X = X.astype(self.dtype)
+            if self.order == 'C' and not X.flags.c_contiguous:
+                X = np.ascontiguousarray(X)
+            elif self.order == 'F' and not X.flags.f_contiguous:
+                X = np.asfortranarray(X)
+        y = np.ascontiguousarray(np.asarray(y, dtype=self.label_dtype).ravel())
+        return X, y
+
+    def _allocate_array(self, name, shape, dtype, scratch=False):
+        """
+        Create a memory-mapped array in the cache entry being built.
+
+        Unless `scratch` is set, the file is where `_save_array(name, ...)` would store a
+        dense array (for the .npy format), so the array is not copied when it is written.
+        Scratch arrays, and arrays of other formats, are removed once the cache is written.
+        """
+
+        path = os.path.join(self.cache_path, name)
+        if scratch or self.cache_format != 'npy':
+            return np.lib.format.open_memmap(path + '.scratch.npy', mode='w+', dtype=dtype, shape=shape)
+        a = np.lib.format.open_memmap(path + '.npy', mode='w+', dtype=dtype, shape=shape,
+                                      fortran_order=(self.order == 'F' and len(shape) > 1))
+        self._allocated[path] = a
+        return a
+
+    def _gather_rows(self, name, X, rows, block_bytes=64*1024*1024):
+        # copy rows of X to a new array in the cache entry, in blocks of about `block_bytes`
+        if issparse(X):
+            X = csr_matrix(X, copy=False)
+            indptr = self._allocate_array(name + '.indptr', (len(rows) + 1,), X.indptr.dtype)
+            indptr[0] = 0
+            np.cumsum(np.diff(X.indptr)[rows], out=indptr[1:])
+            data = self._allocate_array(name + '.data', (indptr[-1],), self.dtype or X.dtype)
+            indices = self._allocate_array(name + '.indices', (indptr[-1],), X.indices.dtype)
+            block_rows = max(1, block_bytes * len(rows) // max(1, indptr[-1] * X.data.itemsize))
+            for start in range(0, len(rows), block_rows):
+                stop = min(start + block_rows, len(rows))
+                block = X[rows[start:stop]]
+                data[indptr[start]:indptr[stop]] = block.data
+                indices[indptr[start]:indptr[stop]] = block.indices
+            out = csr_matrix((len(rows), X.shape[1]), dtype=data.dtype)
+            out.data, out.indices, out.indptr = data, indices, indptr
+            return out
+        out = self._allocate_array(name, (len(rows),) + X.shape[1:], self.dtype or X.dtype)
+        block_rows = max(1, block_bytes // max(1, out[:1].nbytes))
+        for start in range(0, len(rows), block_rows):
+            out[start:start+block_rows] = X[rows[start:start+block_rows]]
+        return out
+
+    def _split(self, X, y, test_size, random_state, stratify=False):
+        """
+        Split X and y like `train_test_split`, but gather the rows of X block by block into
+        memory-mapped arrays in the cache entry (the first two of `self.files`), so that no
+        in-memory copy of the split features is made.
+        """
+
+        from sklearn.model_selection import train_test_split
+        with self._timed('split') as event:
+            train_index, test_index = train_test_split(np.arange(X.shape[0]), test_size=test_size, random_state=random_state,
+                                                       stratify=y if stratify else None)
+            X_train = self._gather_rows(self.files[0], X, train_index)
+            X_test = self._gather_rows(self.files[1], X, test_index)
+            event.rows = X.shape[0]
+        return X_train, X_test, y[train_index], y[test_index]
+
+    def _emit(self, event):
+        for hook in HOOKS + self.hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                print("Warning: phase event hook %r failed: %r" % (hook, e))
+
+    @contextmanager
+    def _timed(self, phase):
+        # a phase of building or reading the cache; the body may set `bytes` and `rows` of the yielded event
+        event = PhaseEvent(self.name, phase, self._phases[-1] if self._phases else None)
+        event.start = time.time()
+        self._emit(event)
+        self._phases.append(phase)
+        if self._profiler is not None:
+            self._profiler.enter(self.name, phase)
+        start = time.perf_counter()
+        try:
+            yield event
+        except BaseException as e:
+            event.error = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            if self._profiler is not None:
+                self._profiler.exit()
+            self._phases.pop()
+            self.timings[phase] = self.timings.get(phase, 0.0) + duration
+            event.end, event.duration = time.time(), duration
+            self._emit(event)
+
+    def _files_bytes(self, files):
+        return sum(os.path.getsize(file) for file in files if os.path.isfile(file))
+
+    @contextmanager
+    def _monitored(self, phase):
+        with MemoryMonitor(trace=self.trace_memory) as monitor:
+            yield
+        self.memory[phase] = monitor.summary()
+
+    def _download_file(self, url, filename, sha256=None):
+        from .download import download_file
+        print("Downloading file: %s" % (url))
+        download_file(url, filename, sha256=sha256)
 
     def download_raw_data(self):
         pass
 
+    def _iter_raw_batches(self, batch_size):
+        # (X, y) batches of the raw data, in the feature space of the cache; datasets that
+        # implement it set SUPPORTS_RAW_BATCHES
+        pass
+
     def preprocess_data(self):
         pass
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
         pass
 
-    def read_cache_data(self):
+    def read_cache_data(self, mmap=False):
         pass
 
-    def get_train_test_split(self):
+    def _read_cache(self, key, mmap):
+        print("Reading binary %s dataset (cache %s) from disk." % (self.name, key))
+        self.manifest.touch(self.name, key)
+        with self._timed('read') as event:
+            data = self.read_cache_data(mmap=mmap)
+            event.rows = data[0].shape[0] + data[1].shape[0]
+            if not mmap:
+                event.bytes = self._files_bytes(file for name in self.files for file in self._array_files(name))
+            return data
+
+    def _prepare_cache(self):
+        # returns the key of the cache entry, building it if needed
 
-        if self.__check_cache_exist():
-            print("Reading binary %s dataset (cache) from disk." % (self.name))
-            return self.read_cache_data()
+        with self._timed('digest'):
+            raw = self._raw_digests()
+        key = self._find_cache(raw)
+        if key is not None:
+            return key
 
         print("Creating working directory: %s" % (self.working_dir))
         os.makedirs(self.working_dir, exist_ok=True)
 
         print("Downloading %s dataset." % (self.name))
         print("Please note: subsequent calls to `get_train_test_split` will read cached binary data, and thus be much faster.")
-        self.download_raw_data()
+        with self._timed('download') as event:
+            self.download_raw_data()
+            event.bytes = self._files_bytes(self.raw_files())
+
+        with self._timed('digest'):
+            raw = self._raw_digests()
+        key = self._find_cache(raw)
+        if key is not None:
+            return key
+        key = self._cache_key(raw)
+
+        # write to a private directory and rename it into place, so that readers
+        # never see a partially written cache entry; preprocessing may already
+        # write its (memory-mapped) outputs there
+        final_path = os.path.join(self.working_dir, key)
+        self.cache_path = '%s.tmp-%d' % (final_path, os.getpid())
+        os.makedirs(self.cache_path, exist_ok=True)
+        self._allocated = {}
 
-        print("Preprocessing %s dataset." % (self.name))
-        X_train, X_test, y_train, y_test = self.preprocess_data()
+        try:
+            with self._timed('import'):
+                for module in self.IMPORTS:
+                    importlib.import_module(module)
+            print("Preprocessing %s dataset." % (self.name))
+            with self._timed('preprocess') as event, self._monitored('preprocess'):
+                X_train, X_test, y_train, y_test = self.preprocess_data()
+                event.rows = X_train.shape[0] + X_test.shape[0]
+                event.bytes = self._files_bytes(self.raw_files())
+            with self._timed('layout') as event:
+                X_train, y_train = self._apply_layout(X_train, y_train)
+                X_test, y_test = self._apply_layout(X_test, y_test)
+                event.rows = X_train.shape[0] + X_test.shape[0]
 
-        print("Writing binary %s dataset (cache) to disk." % (self.name))
-        self.write_cache_data(X_train, X_test, y_train, y_test)
+            print("Writing binary %s dataset (cache %s) to disk." % (self.name, key))
+            with self._timed('write') as event:
+                self.write_cache_data(X_train, X_test, y_train, y_test)
+                event.rows = X_train.shape[0] + X_test.shape[0]
+                event.bytes = self._files_bytes(os.path.join(self.cache_path, file) for file in os.listdir(self.cache_path)
+                                                if not file.endswith('.scratch.npy'))
+        except BaseException:
+            self._allocated = {}
+            shutil.rmtree(self.cache_path, ignore_errors=True)
+            raise
+
+        # the built arrays may be writable memory maps of the cache entry or of scratch files;
+        # they are dropped, so that the files can be removed and callers read the published cache
+        for m in self._allocated.values():
+            m.flush()
+        self._allocated = {}
+        del X_train, X_test, y_train, y_test
+        for file in os.listdir(self.cache_path):
+            if file.endswith('.scratch.npy'):
+                os.remove(os.path.join(self.cache_path, file))
 
         assert self.__check_cache_exist()
 
-        return X_train, X_test, y_train, y_test
+        if os.path.isdir(final_path):
+            # another process has built the same variant in the meantime
+            shutil.rmtree(self.cache_path)
+        else:
+            os.rename(self.cache_path, final_path)
+        self.cache_path = final_path
+
+        self.manifest.register(self.name, key, final_path, self.params, raw)
+        if self.max_cache_bytes is not None:
+            self.manifest.evict(self.max_cache_bytes, keep={'%s/%s' % (self.name, key)})
+
+        return key
+
+    def prepare(self):
+        """
+        Download and preprocess the dataset if it is not cached yet, and return the key of its cache entry.
+        """
+
+        return self._prepare_cache()
+
+    def _subset_rows(self, y, fraction, shard, seed):
+        # rows of one split to keep, as a slice if seed is None and otherwise as sorted indices
+        n_rows = len(y)
+        if seed is None:
+            start, stop = 0, n_rows if fraction is None else int(round(fraction * n_rows))
+            if shard is not None:
+                k, n = shard
+                start, stop = (stop * k) // n, (stop * (k + 1)) // n
+            return slice(start, stop)
+
+        classes, inverse = np.unique(y, return_inverse=True)
+        if len(classes) > self.MAX_STRATA:
+            groups = [np.arange(n_rows)]
+        else:
+            order = np.argsort(inverse, kind='stable')
+            groups = np.split(order, np.cumsum(np.bincount(inverse))[:-1])
+
+        # every class is permuted with the same generator, so that all shards agree on the permutation
+        rng = np.random.RandomState(seed)
+        rows = []
+        for group in groups:
+            group = rng.permutation(group)
+            if fraction is not None:
+                group = group[:int(round(fraction * len(group)))]
+            if shard is not None:
+                group = group[shard[0]::shard[1]]
+            rows.append(group)
+        return np.sort(np.concatenate(rows))
+
+    def _take_rows(self, X, rows):
+        if isinstance(rows, slice) and issparse(X):
+            # slice the CSR component arrays directly, so that memory-mapped data is not copied
+            # (the constructor would copy slices that are small relative to the whole array)
+            lo, hi = X.indptr[rows.start], X.indptr[rows.stop]
+            sub = csr_matrix((rows.stop - rows.start, X.shape[1]), dtype=X.dtype)
+            sub.data, sub.indices, sub.indptr = X.data[lo:hi], X.indices[lo:hi], X.indptr[rows.start:rows.stop+1] - lo
+            return sub
+        return X[rows]
+
+    def get_train_test_split(self, mmap=False, fraction=None, shard=None, seed=0):
+        """
+        Return X_train, X_test, y_train, y_test, optionally restricted to a subset of their rows.
+
+        `fraction` keeps that fraction of the rows of both splits, and `shard=(k, n)` keeps the
+        k-th of n disjoint shards of them (of the fraction, if both are given). The rows are
+        drawn with `seed`, per class for classification datasets, so the class balance is
+        preserved and every process computes the same shards. With `seed=None` contiguous rows
+        are taken instead, which over a memory-mapped cache are views rather than copies.
+        """
+
+        self._check_subset(fraction, shard)
+
+        key = self._prepare_cache()
+        # always read back, so that the arrays are independent of the cache files (or read-only
+        # memory maps of them), never the writable arrays the cache was built in
+        data = self._read_cache(key, mmap)
+        return self.subset(data, fraction, shard, seed)
+
+    def _check_subset(self, fraction, shard):
+        if fraction is not None and not 0.0 < fraction <= 1.0:
+            raise ValueError("fraction must be in (0, 1], got %s" % (fraction))
+        if shard is not None and not 0 <= shard[0] < shard[1]:
+            raise ValueError("shard must be (k, n) with 0 <= k < n, got %s" % (shard,))
+
+    def subset(self, data, fraction=None, shard=None, seed=0):
+        """
+        Restrict `data`, the (X_train, X_test, y_train, y_test) of `get_train_test_split`, to
+        the rows that `get_train_test_split(fraction=fraction, shard=shard, seed=seed)` returns.
+        Taking several subsets of one memory-mapped split avoids loading the data for each.
+        """
+
+        self._check_subset(fraction, shard)
+        if fraction is None and shard is None:
+            return data
+
+        X_train, X_test, y_train, y_test = data
+        train_rows = self._subset_rows(y_train, fraction, shard, seed)
+        test_rows = self._subset_rows(y_test, fraction, shard, seed)
+        return (self._take_rows(X_train, train_rows), self._take_rows(X_test, test_rows),
+                y_train[train_rows], y_test[test_rows])
+
+    def get_lazy_split(self, mmap=False, prefetch=False):
+        """
+        Return a `LazySplit` that reads X_train, X_test, y_train and y_test on first access.
+
+        `prefetch` may be True, or a list of split names, to load those splits in a
+        background thread (for memory-mapped splits, to read them into the page cache).
+        """
+
+        key = self._prepare_cache()
+        self.manifest.touch(self.name, key)
+        return LazySplit(self, mmap, prefetch)
+
+    def _raw_batches(self, batch_size):
+        batches = self._iter_raw_batches(batch_size)
+        if not all(os.path.isfile(file) for file in self.raw_files()):
+            os.makedirs(self.working_dir, exist_ok=True)
+            self.download_raw_data()
+        return batches
+
+    def _batch_rows(self, n_rows, index, val_fraction, test_fraction, seed):
+        # the rows of batch `index` in each split: a shuffle seeded with `seed + index`, divided by the fractions
+        if val_fraction <= 0.0 and test_fraction <= 0.0:
+            return {'train': slice(None), 'val': slice(0, 0), 'test': slice(0, 0)}
+        rows = np.arange(n_rows)
+        np.random.RandomState(seed + index).shuffle(rows)
+        train_rows, val_rows, test_rows = np.split(
+            rows, [int((1.0-val_fraction-test_fraction)*len(rows)), int((1.0-test_fraction)*len(rows))]
+        )
+        return {'train': train_rows, 'val': val_rows, 'test': test_rows}
+
+    def _check_batches(self, splits, source):
+        # raised when iterating is requested rather than on the first batch
+        for split in splits:
+            if split not in ['train', 'val', 'test']:
+                raise ValueError("Unknown split: %s" % (split))
+        if source not in ['cache', 'raw']:
+            raise ValueError("Unknown source: %s" % (source))
+        if source == 'raw' and not self.SUPPORTS_RAW_BATCHES:
+            raise ValueError("%s does not support streaming batches from the raw data; use source='cache'" % (self.name))
+
+    def _convert_batch(self, X_batch, y_batch, dtype):
+        y_batch = np.asarray(y_batch, dtype=self.label_dtype)
+        if issparse(X_batch):
+            return X_batch.astype(dtype or self.dtype or X_batch.dtype), y_batch
+        return np.ascontiguousarray(X_batch, dtype=dtype or self.dtype), y_batch
+
+    def iter_batches(self, batch_size, split='train', source='cache', val_fraction=0.0, test_fraction=0.0, seed=0, dtype=None):
+        """
+        Iterate over (X, y) batches of one split, with X converted to `dtype` (by default the
+        dtype of the dataset) and y to the label dtype of the dataset.
+
+        With `source='cache'` the batches are read from the memory-mapped cache: 'test' yields
+        X_test, while 'train' and 'val' divide each batch of X_train according to `val_fraction`.
+        With `source='raw'` (for datasets with SUPPORTS_RAW_BATCHES) the batches are streamed from
+        the raw data in its order, and each batch is divided into 'train', 'val' and 'test' rows
+        according to the two fractions.
+        The division of batch `i` is a shuffle seeded with `seed + i`, so it is deterministic and
+        the same for every split. To get several splits from one pass, use `iter_splits`.
+        """
+
+        self._check_batches([split], source)
+        return self._iter_batches(batch_size, split, source, val_fraction, test_fraction, seed, dtype)
+
+    def _iter_batches(self, batch_size, split, source, val_fraction, test_fraction, seed, dtype):
+        if source == 'cache':
+            data = self.get_lazy_split(mmap=True)
+            X, y = (data.X_test, data.y_test) if split == 'test' else (data.X_train, data.y_train)
+            batches = ((X[i:i+batch_size], y[i:i+batch_size]) for i in range(0, X.shape[0], batch_size))
+            if split == 'test':
+                val_fraction = 0.0
+            test_fraction = 0.0
+        else:
+            batches = self._raw_batches(batch_size)
+
+        for index, (X_batch, y_batch) in enumerate(batches):
+            rows = self._batch_rows(X_batch.shape[0], index, val_fraction, test_fraction, seed)[split]
+            yield self._convert_batch(X_batch[rows], y_batch[rows], dtype)
+
+    def iter_splits(self, batch_size, splits=('train', 'val', 'test'), source='cache', val_fraction=0.0, test_fraction=0.0, seed=0, dtype=None):
+        """
+        Like `iter_batches`, but yield a dict with the (X, y) batch of each of `splits` per batch,
+        so that several splits are read in a single pass over the data. Batch `i` of a split has
+        the same rows as batch `i` of `iter_batches` for that split, except that with
+        `source='cache'` the 'test' batches are slices of X_test of about the same number of
+        rows per batch as there are batches of X_train.
+        """
+
+        self._check_batches(splits, source)
+        return self._iter_splits(batch_size, splits, source, val_fraction, test_fraction, seed, dtype)
+
+    def _iter_splits(self, batch_size, splits, source, val_fraction, test_fraction, seed, dtype):
+        if source == 'cache':
+            data = self.get_lazy_split(mmap=True)
+            n_batches = max(1, -(-data.X_train.shape[0] // batch_size))
+            test_size = -(-data.X_test.shape[0] // n_batches)
+            for index in range(n_batches):
+                train = slice(index*batch_size, (index+1)*batch_size)
+                X_batch, y_batch = data.X_train[train], data.y_train[train]
+                rows = self._batch_rows(X_batch.shape[0], index, val_fraction, 0.0, seed)
+                test = slice(index*test_size, (index+1)*test_size)
+                batch = {}
+                for split in splits:
+                    if split == 'test':
+                        batch[split] = self._convert_batch(data.X_test[test], data.y_test[test], dtype)
+                    else:
+                        batch[split] = self._convert_batch(X_batch[rows[split]], y_batch[rows[split]], dtype)
+                yield batch
+        else:
+            for index, (X_batch, y_batch) in enumerate(self._raw_batches(batch_size)):
+                rows = self._batch_rows(X_batch.shape[0], index, val_fraction, test_fraction, seed)
+                yield {split: self._convert_batch(X_batch[rows[split]], y_batch[rows[split]], dtype) for split in splits}
+
+class LazySplit():
+    """
+    Train/test split of a cached dataset whose arrays are loaded on first access.
+
+    Unpacking it (`X_train, X_test, y_train, y_test = split`) loads all four arrays.
+    """
+
+    SPLITS = ['X_train', 'X_test', 'y_train', 'y_test']
+
+    def __init__(self, dataset, mmap=False, prefetch=False):
+        self.dataset = dataset
+        self.mmap = mmap
+        self._arrays = {}
+        self._locks = {split: threading.Lock() for split in self.SPLITS}
+        if prefetch:
+            splits = self.SPLITS if prefetch is True else list(prefetch)
+            self._prefetch_thread = threading.Thread(target=self._prefetch, args=(splits,), daemon=True)
+            self._prefetch_thread.start()
+
+    def _file(self, split):
+        return self.dataset.files[self.SPLITS.index(split)]
+
+    def _prefetch(self, splits):
+        for split in splits:
+            self.load(split)
+            if self.mmap and hasattr(os, 'posix_fadvise'):
+                for file in self.dataset._array_files(self._file(split)):
+                    fd = os.open(file, os.O_RDONLY)
+                    try:
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    finally:
+                        os.close(fd)
+
+    def load(self, split):
+        with self._locks[split]:
+            if split not in self._arrays:
+                self._arrays[split] = self.dataset._load_array(self._file(split), self.mmap)
+        return self._arrays[split]
+
+    def loaded(self):
+        return [split for split in self.SPLITS if split in self._arrays]
+
+    @property
+    def X_train(self):
+        return self.load('X_train')
+
+    @property
+    def X_test(self):
+        return self.load('X_test')
+
+    @property
+    def y_train(self):
+        return self.load('y_train')
+
+    @property
+    def y_test(self):
+        return self.load('y_test')
 
+    def __iter__(self):
+        return iter([self.load(split) for split in self.SPLITS])
@@ -0,0 +1,161 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from tqdm.auto import tqdm
+
+CHUNK_SIZE = 1024 * 1024
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+SEGMENT_SIZE = 32 * 1024 * 1024
+
+def sha256sum(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _probe(session, url):
+    # returns (size, supports_ranges); size is 0 if the server does not report it
+    r = session.head(url, allow_redirects=True)
+    size = int(r.headers.get('content-length', 0))
+    if r.ok and r.headers.get('accept-ranges', '').lower() == 'bytes':
+        return size, True
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True) as r:
+        if r.status_code == 206:
+            # 'bytes 0-0/*' if the server does not know the length; the segments need it
+            total = r.headers.get('content-range', '').rsplit('/', 1)[-1].strip()
+            if total.isdigit():
+                return int(total), True
+            return size, False
+        return int(r.headers.get('content-length', size)), False
+
+class _SegmentState():
+    """
+    Persistent record of the completed segments of a partial download.
+    """
+
+    def __init__(self, filename, size, segment_size):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.state = {'size': size, 'segment_size': segment_size, 'done': []}
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                state = json.load(f)
+            if state.get('size') == size and state.get('segment_size') == segment_size:
+                self.state = state
+
+    def reset(self):
+        self.state['done'] = []
+
+    @property
+    def done(self):
+        return set(self.state['done'])
+
+    def mark_done(self, segment):
+        with self.lock:
+            self.state['done'].append(segment)
+            tmp = self.filename + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.filename)
+
+def _download_segment(session, url, part_file, start, end, state, segment, pb):
+    with session.get(url, headers={'Range': 'bytes=%d-%d' % (start, end)}, stream=True) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise RuntimeError("Server ignored range request for %s" % (url))
+        with open(part_file, 'r+b', buffering=WRITE_BUFFER_SIZE) as f:
+            f.seek(start)
+            for data in r.iter_content(CHUNK_SIZE):
+                f.write(data)
+                pb.update(len(data))
+    state.mark_done(segment)
+
+def _download_stream(session, url, part_file, pb):
+    with session.get(url, allow_redirects=True, stream=True) as r:
+        r.raise_for_status()
+        with open(part_file, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            for data in r.iter_content(CHUNK_SIZE):
+                f.write(data)
+                pb.update(len(data))
+
+def download_file(url, filename, n_connections=8, segment_size=SEGMENT_SIZE, sha256=None):
+    """
+    Download `url` to `filename`.
+
+    If the server supports HTTP range requests, the file is fetched in segments of
+    `segment_size` bytes over `n_connections` pooled connections. Data is written to
+    `filename.part` and the completed segments are recorded in `filename.part.json`,
+    so an interrupted download resumes where it stopped. If `sha256` is given, the
+    checksum of the downloaded file is verified.
+    """
+
+    session = requests.Session()
+    # segments are byte ranges of the file as stored, so ask for it without transfer encoding
+    session.headers['Accept-Encoding'] = 'identity'
+    session.mount('http://', HTTPAdapter(pool_maxsize=n_connections))
+    session.mount('https://', HTTPAdapter(pool_maxsize=n_connections))
+
+    tot_size, supports_ranges = _probe(session, url)
+
+    if os.path.isfile(filename) and os.stat(filename).st_size == tot_size:
+        if sha256 is None or sha256sum(filename) == sha256:
+            print("File %s with correct size exists; skipping download" % (filename))
+            return
+        print("File %s has wrong checksum; downloading again" % (filename))
+
+    part_file = filename + '.part'
+    state_file = part_file + '.json'
+
+    if supports_ranges and tot_size > 0:
+        state = _SegmentState(state_file, tot_size, segment_size)
+        if not os.path.isfile(part_file) or os.stat(part_file).st_size != tot_size:
+            state.reset()
+            with open(part_file, 'wb') as f:
+                f.truncate(tot_size)
+        done = state.done
+        segments = [s for s in range(0, tot_size, segment_size) if s not in done]
+        if done:
+            print("Resuming download: %d of %d segments already complete" % (len(done), len(done) + len(segments)))
+        pb = tqdm(total=tot_size, initial=tot_size - sum(min(segment_size, tot_size - s) for s in segments), unit='iB', unit_scale=True)
+        with ThreadPoolExecutor(max_workers=n_connections) as pool:
+            futures = [pool.submit(_download_segment, session, url, part_file, s, min(s + segment_size, tot_size) - 1, state, s, pb)
+                       for s in segments]
+            for future in futures:
+                future.result()
+        pb.close()
+    else:
+        pb = tqdm(total=tot_size, unit='iB', unit_scale=True)
+        _download_stream(session, url, part_file, pb)
+        pb.close()
+
+    if tot_size > 0 and os.stat(part_file).st_size != tot_size:
+        raise RuntimeError("Download of %s is incomplete: %d of %d bytes" % (url, os.stat(part_file).st_size, tot_size))
+
+    if sha256 is not None and sha256sum(part_file) != sha256:
+        os.remove(part_file)
+        if os.path.isfile(state_file):
+            os.remove(state_file)
+        raise RuntimeError("Checksum mismatch for %s" % (url))
+
+    os.replace(part_file, filename)
+    if os.path.isfile(state_file):
+        os.remove(state_file)
@@ -13,42 +13,46 @@
 # limitations under the License.
 
 from .dataset import Dataset
+from .ingest import read_svmlight
 import os
-import subprocess
-from sklearn.datasets import load_svmlight_file
-from sklearn.model_selection import train_test_split
 import numpy as np
 
 class Epsilon(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['epsilon.X_train.npy',
-                 'epsilon.X_test.npy',
-                 'epsilon.y_train.npy',
-                 'epsilon.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 8
+
+    IMPORTS = Dataset.IMPORTS + ['sklearn.datasets']
+
+    def __init__(self, cache_dir, test_size=0.25, random_state=42, **kwargs):
+        files = ['epsilon.X_train',
+                 'epsilon.X_test',
+                 'epsilon.y_train',
+                 'epsilon.y_test']
+        params = {'test_size': test_size, 'random_state': random_state}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_file = os.path.join(self.working_dir, 'epsilon_normalized.bz2')
      
     def download_raw_data(self):
         self._download_file('https://www.csie.ntu.edu.tw/~cjlin/libsvmtools/datasets/binary/epsilon_normalized.bz2', self.raw_file)
 
     def preprocess_data(self):
-        X, y = load_svmlight_file(self.raw_file)
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42)
-        X_train = np.array(X_train.todense(), dtype=np.float32)
-        X_test = np.array(X_test.todense(), dtype=np.float32)
-        return X_train, X_test, y_train, y_test
+        # parse straight into a dense float32 memory map, without a float64 or sparse intermediate,
+        # and gather the split rows from it block by block
+        X = self._allocate_array('epsilon.X', (400_000, 2000), np.float32, scratch=True)
+        with self._timed('parse') as event:
+            X, y = read_svmlight(self.raw_file, n_features=2000, zero_based=False, dtype=np.float32, dense=True, out=X)
+            event.bytes, event.rows = self._files_bytes([self.raw_file]), X.shape[0]
+        return self._split(X, y, self.params['test_size'], self.params['random_state'])
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        np.save(os.path.join(self.working_dir, 'epsilon.X_train'), X_train)
-        np.save(os.path.join(self.working_dir, 'epsilon.X_test'), X_test)
-        np.save(os.path.join(self.working_dir, 'epsilon.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'epsilon.y_test'), y_test)
-
-    def read_cache_data(self):
-        X_train = np.load(os.path.join(self.working_dir, 'epsilon.X_train.npy'))
-        X_test = np.load(os.path.join(self.working_dir, 'epsilon.X_test.npy'))
-        y_train = np.load(os.path.join(self.working_dir, 'epsilon.y_train.npy'))
-        y_test = np.load(os.path.join(self.working_dir, 'epsilon.y_test.npy'))
-        return X_train, X_test, y_train, y_test
+        self._save_array('epsilon.X_train', X_train)
+        self._save_array('epsilon.X_test', X_test)
+        self._save_array('epsilon.y_train', y_train)
+        self._save_array('epsilon.y_test', y_test)
 
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('epsilon.X_train', mmap)
+        X_test = self._load_array('epsilon.X_test', mmap)
+        y_train = self._load_array('epsilon.y_train', mmap)
+        y_test = self._load_array('epsilon.y_test', mmap)
+        return X_train, X_test, y_train, y_test
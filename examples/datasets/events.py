@@ -0,0 +1,109 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import cProfile
+
+# hooks called with every phase event of every dataset, in addition to the hooks of a dataset
+HOOKS = []
+
+def add_hook(hook):
+    HOOKS.append(hook)
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+class PhaseEvent():
+    """
+    A phase of building or reading a dataset cache, e.g. 'download', 'parse' or 'write'.
+
+    Hooks are called twice per phase: when it starts (`end` is None) and when it ends. `start`
+    and `end` are Unix times, `duration` is measured with `perf_counter`, and `bytes` and
+    `rows` are the amount of data the phase has processed, where it is known. `parent` is the
+    enclosing phase, e.g. 'preprocess' for the steps of a dataset's preprocessing.
+    """
+
+    def __init__(self, dataset, phase, parent=None):
+        self.dataset = dataset
+        self.phase = phase
+        self.parent = parent
+        self.start = None
+        self.end = None
+        self.duration = None
+        self.bytes = None
+        self.rows = None
+        self.error = None
+
+    def as_dict(self):
+        return dict(vars(self))
+
+def print_event(event):
+    # a hook that prints every finished phase
+    if event.end is None:
+        return
+    extra = ''
+    if event.bytes is not None:
+        extra += ', %.1f MB (%.1f MB/s)' % (event.bytes / 1e6, event.bytes / 1e6 / max(event.duration, 1e-9))
+    if event.rows is not None:
+        extra += ', %d rows' % (event.rows)
+    print("[%s] %s: %.2f s%s%s" % (event.dataset, event.phase, event.duration, extra, ' (failed)' if event.error else ''))
+
+class JsonLinesWriter():
+    """
+    A hook that appends every finished phase as a JSON line to `filename`; processes may share the file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __call__(self, event):
+        if event.end is None:
+            return
+        line = json.dumps(event.as_dict(), default=str) + '\n'
+        # a single write of the whole line, so that the lines of concurrent processes do not interleave
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+class PhaseProfiler():
+    """
+    Profiles phases with cProfile and dumps the statistics of each to `<directory>/<dataset>-<phase>.prof`,
+    to be read with `pstats` or turned into a flame graph with e.g. flameprof or snakeviz.
+
+    The profile of a phase excludes its sub-phases, which are profiled separately. Repeated phases
+    (e.g. parsing several files) are accumulated into one profile.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._profiles = {}
+        self._stack = []
+
+    def enter(self, dataset, phase):
+        if self._stack:
+            self._stack[-1][1].disable()
+        profile = self._profiles.setdefault((dataset, phase), cProfile.Profile())
+        self._stack.append(((dataset, phase), profile))
+        profile.enable()
+
+    def exit(self):
+        (dataset, phase), profile = self._stack.pop()
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(os.path.join(self.directory, '%s-%s.prof' % (dataset, phase)))
+        if self._stack:
+            self._stack[-1][1].enable()
@@ -0,0 +1,256 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import io
+import gzip
+import bz2
+import shutil
+import subprocess
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from scipy.sparse import csr_matrix
+
+DEFAULT_BLOCK_SIZE = 32 * 1024 * 1024
+
+# external decompressors that use more than one core, tried in order
+PARALLEL_DECOMPRESSORS = {
+    '.gz': [['pigz', '-dc']],
+    '.bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc']],
+}
+
+class _ProcessReader():
+
+    def __init__(self, cmd, filename):
+        self.p = subprocess.Popen(cmd + [filename], stdout=subprocess.PIPE)
+
+    def read(self, size):
+        return self.p.stdout.read(size)
+
+    def close(self):
+        self.p.stdout.close()
+        if self.p.wait() != 0:
+            raise RuntimeError("Decompression of %s failed with exit code %d" % (self.p.args[-1], self.p.returncode))
+
+def open_decompressed(filename):
+    """
+    Open a (possibly compressed) file for binary reading.
+
+    Decompression runs in an external multi-threaded tool (pigz, lbzip2, pbzip2)
+    if one is installed, so that it overlaps with parsing in this process.
+    Otherwise the gzip/bz2 modules of the standard library are used.
+    """
+    ext = os.path.splitext(filename)[1]
+    for cmd in PARALLEL_DECOMPRESSORS.get(ext, []):
+        if shutil.which(cmd[0]) is not None:
+            return _ProcessReader(cmd, filename)
+    if ext == '.gz':
+        return gzip.open(filename, 'rb')
+    if ext == '.bz2':
+        return bz2.open(filename, 'rb')
+    return open(filename, 'rb')
+
+def iter_line_blocks(filename, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Yield chunks of roughly `block_size` decompressed bytes that end on a line boundary.
+    """
+    f = open_decompressed(filename)
+    try:
+        rest = b''
+        while True:
+            buf = f.read(block_size)
+            if not buf:
+                break
+            buf = rest + buf
+            cut = buf.rfind(b'\n') + 1
+            rest = buf[cut:]
+            if cut > 0:
+                yield buf[:cut]
+        if rest.strip():
+            yield rest + b'\n'
+    finally:
+        f.close()
+
+def count_lines(filename, block_size=DEFAULT_BLOCK_SIZE):
+    return sum(block.count(b'\n') for block in iter_line_blocks(filename, block_size))
+
+def normalize_rows(X, norm):
+    # in-place row normalization of a dense float block
+    if norm is None:
+        return
+    if norm != 'l1':
+        raise ValueError("Unsupported norm: %s" % (norm))
+    norms = np.abs(X).sum(axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    X /= norms
+
+def _parse_csv_block(block, X, y, offset, n, label_col, norm):
+    import pandas as pd
+    values = pd.read_csv(io.BytesIO(block), header=None, dtype=X.dtype, engine='c').values
+    if values.shape[0] != n:
+        raise RuntimeError("Parsed %d rows from a block of %d lines" % (values.shape[0], n))
+    y[offset:offset+n] = values[:, label_col]
+    features = np.delete(values, label_col, axis=1)
+    normalize_rows(features, norm)
+    X[offset:offset+n] = features
+
+def read_csv(filename, n_rows=None, label_col=0, dtype=np.float32, norm=None,
+             block_size=DEFAULT_BLOCK_SIZE, n_jobs=None, out=None):
+    """
+    Read a headerless numeric CSV file into a `dtype` feature matrix and a label vector.
+
+    The decompressed stream is cut into line-aligned blocks of `block_size` bytes which
+    are parsed by `n_jobs` threads straight into the preallocated output. Rows are
+    normalized block by block if `norm='l1'`, so no full-size temporaries are created.
+    If `n_rows` is not given, the file is decompressed once to count the rows. The features
+    can be parsed into a preallocated matrix `out` (e.g. a memory map) of the right shape.
+    """
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    if out is not None:
+        n_rows = out.shape[0]
+    elif n_rows is None:
+        n_rows = count_lines(filename, block_size)
+
+    X = out
+    y = np.empty(n_rows, dtype=np.float64)
+    offset = 0
+
+    # keep a bounded number of blocks in flight, so that memory use depends on
+    # `n_jobs` and `block_size` rather than on the size of the file
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for block in iter_line_blocks(filename, block_size):
+            if X is None:
+                n_cols = block[:block.index(b'\n')].count(b',') + 1
+                X = np.empty((n_rows, n_cols - 1), dtype=dtype)
+            n = block.count(b'\n')
+            if offset + n > n_rows:
+                raise RuntimeError("File %s has more than the expected %d rows" % (filename, n_rows))
+            pending.append(pool.submit(_parse_csv_block, block, X, y, offset, n, label_col, norm))
+            offset += n
+            if len(pending) >= 2 * n_jobs:
+                pending.popleft().result()
+        while pending:
+            pending.popleft().result()
+
+    if offset != n_rows:
+        raise RuntimeError("File %s has %d rows, expected %d" % (filename, offset, n_rows))
+
+    return X, y
+
+def _parse_svmlight_block(block, dtype, n_features, base):
+    # indices are parsed as they appear in the file; the caller decides on the
+    # base (0 or 1) once all blocks have been seen, unless it is known up front
+    from sklearn.datasets import load_svmlight_file
+    X, y = load_svmlight_file(io.BytesIO(block), dtype=dtype, zero_based=True)
+    lo = X.indices.min() if X.nnz > 0 else np.iinfo(np.int64).max
+    hi = X.indices.max() if X.nnz > 0 else -1
+    if n_features is not None and base is not None:
+        if hi - base >= n_features:
+            raise ValueError("Feature index %d exceeds n_features=%d" % (hi - base, n_features))
+        X = csr_matrix((X.data, X.indices - base, X.indptr), shape=(X.shape[0], n_features))
+        return X.toarray(), y, lo, hi
+    return (X.data, X.indices, X.indptr), y, lo, hi
+
+def _merge_csr_shards(shards, n_rows, n_features, base, dtype):
+    nnz = sum(len(data) for data, indices, indptr in shards)
+    index_dtype = np.int32 if max(nnz, n_features) < np.iinfo(np.int32).max else np.int64
+    data = np.empty(nnz, dtype=dtype)
+    indices = np.empty(nnz, dtype=index_dtype)
+    indptr = np.empty(n_rows + 1, dtype=index_dtype)
+    indptr[0] = 0
+    row, pos = 0, 0
+    for i in range(len(shards)):
+        shard_data, shard_indices, shard_indptr = shards[i]
+        # release each shard as soon as it is copied to keep the peak close to one copy
+        shards[i] = None
+        n, k = len(shard_indptr) - 1, len(shard_data)
+        data[pos:pos+k] = shard_data
+        np.subtract(shard_indices, base, out=indices[pos:pos+k], casting='unsafe')
+        indptr[row+1:row+n+1] = shard_indptr[1:] + pos
+        row, pos = row + n, pos + k
+    return csr_matrix((data, indices, indptr), shape=(n_rows, n_features), copy=False)
+
+def read_svmlight(filename, n_features=None, zero_based='auto', dtype=np.float64, dense=False,
+                  n_rows=None, block_size=DEFAULT_BLOCK_SIZE, n_jobs=None, out=None):
+    """
+    Read a (possibly compressed) svmlight/libsvm file with a pool of parser processes.
+
+    Line-aligned blocks of the decompressed stream are parsed into CSR shards in parallel
+    and merged into a single CSR matrix; `n_features` and `zero_based` have the same
+    meaning as in `sklearn.datasets.load_svmlight_file`. With `dense=True` each block is
+    instead expanded to a dense `dtype` block and copied into a preallocated matrix, so
+    no full-size sparse or float64 intermediate exists. Dense mode needs `n_features`
+    and an explicit `zero_based`; `n_rows` avoids a counting pass over the file, and `out`
+    is an optional preallocated (e.g. memory-mapped) matrix to fill.
+    """
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    if dense:
+        if n_features is None or zero_based == 'auto':
+            raise ValueError("Dense mode requires n_features and an explicit zero_based")
+        if out is not None:
+            n_rows = out.shape[0]
+        elif n_rows is None:
+            n_rows = count_lines(filename, block_size)
+        X = out if out is not None else np.empty((n_rows, n_features), dtype=dtype)
+
+    base = None if zero_based == 'auto' else int(not zero_based)
+    shards, labels = [], []
+    lo, hi, offset = np.iinfo(np.int64).max, -1, 0
+
+    def collect(future):
+        nonlocal lo, hi, offset
+        block, y, block_lo, block_hi = future.result()
+        lo, hi = min(lo, block_lo), max(hi, block_hi)
+        if dense:
+            n = block.shape[0]
+            if offset + n > n_rows:
+                raise RuntimeError("File %s has more than the expected %d rows" % (filename, n_rows))
+            X[offset:offset+n] = block
+            offset += n
+        else:
+            shards.append(block)
+        labels.append(y)
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        for block in iter_line_blocks(filename, block_size):
+            pending.append(pool.submit(_parse_svmlight_block, block, dtype, n_features if dense else None, base))
+            if len(pending) >= 2 * n_jobs:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+
+    y = np.concatenate(labels)
+
+    if dense:
+        if offset != n_rows:
+            raise RuntimeError("File %s has %d rows, expected %d" % (filename, offset, n_rows))
+        return X, y
+
+    if base is None:
+        base = 1 if lo > 0 else 0
+    if n_features is None:
+        n_features = hi - base + 1
+    elif hi - base >= n_features:
+        raise ValueError("Feature index %d exceeds n_features=%d" % (hi - base, n_features))
+
+    return _merge_csr_shards(shards, len(y), n_features, base, dtype), y
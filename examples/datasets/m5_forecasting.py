@@ -15,18 +15,22 @@ import os
 import io
 import subprocess
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder
 from zipfile import ZipFile
 
 class M5Forecasting(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['m5forecasting.X_train.npy',
-                 'm5forecasting.X_test.npy',
-                 'm5forecasting.y_train.npy',
-                 'm5forecasting.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 16
+
+    IMPORTS = ['pandas', 'sklearn.preprocessing']
+
+    def __init__(self, cache_dir, test_days=28, **kwargs):
+        files = ['m5forecasting.X_train',
+                 'm5forecasting.X_test',
+                 'm5forecasting.y_train',
+                 'm5forecasting.y_test']
+        # the row order is recorded, so that caches built in day-major order are not reused
+        params = {'test_days': test_days, 'row_order': 'week-series-day'}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_file = os.path.join(self.working_dir, 'm5-forecasting-accuracy.zip')
 
     def download_raw_data(self):
@@ -40,6 +44,8 @@ class M5Forecasting(Dataset):
             )
 
     def preprocess_data(self):
+        import pandas as pd
+        from sklearn.preprocessing import LabelEncoder
 
         # Data for the last year
         firstDay = 1535
@@ -52,73 +58,101 @@ class M5Forecasting(Dataset):
         catCols = ['id', 'item_id', 'dept_id','store_id', 'cat_id', 'state_id']
 
         # Read files
-        with ZipFile(self.raw_file, 'r') as a:
-             calendar = pd.read_csv(io.BytesIO(a.read('calendar.csv')))
-             prices = pd.read_csv(io.BytesIO(a.read('sell_prices.csv')))
-             df = pd.read_csv(io.BytesIO(a.read('sales_train_validation.csv')), usecols = catCols + numCols)
-
-        calendar["date"] = pd.to_datetime(calendar["date"])
-
-        df = pd.melt(df,
-                      id_vars = catCols,
-                      value_vars = [col for col in df.columns if col.startswith("d_")],
-                      var_name = "d",
-                      value_name = "sales")
-
-        # Merge "df" with "calendar" and "prices" dataframe
-        df = df.merge(calendar, on = "d", copy = False)
-        df = df.merge(prices, on = ["store_id", "item_id", "wm_yr_wk"], copy = False)
-
-        # Lag features for 1 week, 1 month period
-        dayLags = [7, 28]
-        lagSalesCols = [f"lag_{dayLag}" for dayLag in dayLags]
-        for dayLag, lagSalesCol in zip(dayLags, lagSalesCols):
-            df[lagSalesCol] = df[["id","sales"]].groupby("id")["sales"].shift(dayLag).fillna(-1)
-
-        # Rolling mean features for 1 week, 1 month period
-        windows = [7, 28]
-        for window in windows:
-            for dayLag, lagSalesCol in zip(dayLags, lagSalesCols):
-                df[f"rmean_{dayLag}_{window}"] = df[["id", lagSalesCol]].groupby("id")[lagSalesCol].transform(lambda x: x.rolling(window).mean()).fillna(-1)
-
-
-        # Test dataset -> Last 28 days
-        cutoff = df.date.max() - pd.to_timedelta(28, unit = 'D')
-        xtrain = df.loc[df.date < cutoff].copy()
-        xtest = df.loc[df.date >= cutoff].copy()
-
-
-        xtrain.drop(['id', 'd', 'wm_yr_wk','snap_WI', 'snap_CA', 'snap_TX', 'date', 'weekday', 'month', 'year', 'event_name_1', 'event_type_1', 'event_name_2', 'event_type_2'], axis = 1, inplace = True)
-        xtrain.dropna()
-
-        xtest.drop(['id', 'd', 'wm_yr_wk', 'snap_WI', 'snap_CA', 'snap_TX', 'date', 'weekday', 'month', 'year',  'event_name_1', 'event_type_1', 'event_name_2', 'event_type_2'], axis = 1, inplace = True)
-        xtest.dropna()
-
-        # encode categorical features
-        cat_feats = ['item_id', 'dept_id','store_id', 'cat_id', 'state_id'  ]
-        for cf in cat_feats:
-            enc = LabelEncoder()
-            xtrain[cf] = enc.fit_transform(xtrain[cf])
-            xtest[cf] = enc.transform(xtest[cf])
-
-
-        y_train = xtrain["sales"].to_numpy()
-        X_train = xtrain.drop(['sales'], axis = 1).to_numpy()
-        y_test = xtest["sales"].to_numpy()
-        X_test = xtest.drop(['sales'], axis = 1).to_numpy()
-
-        return X_train, X_test, y_train, y_test
+        with self._timed('parse') as event, ZipFile(self.raw_file, 'r') as a:
+             calendar = pd.read_csv(io.BytesIO(a.read('calendar.csv')), usecols = ['date', 'wm_yr_wk', 'wday', 'd'])
+             prices = pd.read_csv(io.BytesIO(a.read('sell_prices.csv')), dtype = {'store_id': 'category', 'item_id': 'category'})
+             df = pd.read_csv(io.BytesIO(a.read('sales_train_validation.csv')), usecols = catCols + numCols,
+                              dtype = {**{col: 'category' for col in catCols}, **{col: np.float32 for col in numCols}})
+             event.bytes, event.rows = self._files_bytes([self.raw_file]), len(df)
+
+        with self._timed('features') as event:
+            # Work on a (series x day) layout instead of a long frame; sales counts are exact in float32
+            sales = df[numCols].to_numpy()
+            calendar = calendar.set_index("d").loc[numCols]
+            dates = pd.to_datetime(calendar["date"]).to_numpy()
+            weeks, dayWeek = np.unique(calendar["wm_yr_wk"].to_numpy(), return_inverse = True)
+
+            # Join prices by index lookup: (store_id, item_id) -> series, wm_yr_wk -> week
+            series = pd.MultiIndex.from_arrays([df["store_id"].astype(str), df["item_id"].astype(str)])
+            priceSeries = series.get_indexer(pd.MultiIndex.from_arrays([prices["store_id"].astype(str), prices["item_id"].astype(str)]))
+            priceWeek = pd.Index(weeks).get_indexer(prices["wm_yr_wk"])
+            keep = (priceSeries >= 0) & (priceWeek >= 0)
+            weekPrices = np.full((len(df), len(weeks)), np.nan)
+            weekPrices[priceSeries[keep], priceWeek[keep]] = prices["sell_price"].to_numpy()[keep]
+            dayPrices = weekPrices[:, dayWeek]
+
+            # Days without a price have no row, as in an inner join with the prices
+            valid = ~np.isnan(dayPrices)
+
+            # Lags and rolling means run over the rows of each series, i.e. over its valid days.
+            # Compact those into one series-major vector and compute every window from a single
+            # cumulative sum; sales are integers, so the sums are exact.
+            values = sales[valid].astype(np.float64)
+            counts = valid.sum(axis = 1)
+            position = np.arange(len(values)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+            # Lag features for 1 week, 1 month period
+            dayLags = [7, 28]
+            features = {}
+            for dayLag in dayLags:
+                lagged = np.full(len(values), -1.0)
+                lagged[position >= dayLag] = values[np.nonzero(position >= dayLag)[0] - dayLag]
+                features[f"lag_{dayLag}"] = lagged
+
+            # Rolling mean features for 1 week, 1 month period
+            windows = [7, 28]
+            for window in windows:
+                for dayLag in dayLags:
+                    cumsum = np.concatenate([[0.0], np.cumsum(features[f"lag_{dayLag}"])])
+                    end = np.nonzero(position >= window - 1)[0] + 1
+                    rmean = np.full(len(values), -1.0)
+                    rmean[end - 1] = (cumsum[end] - cumsum[end - window]) / window
+                    features[f"rmean_{dayLag}_{window}"] = rmean
+
+            # Rows in the order of the melt and inner merges this replaces (pandas < 2.2, which
+            # groups merged rows by the left key first seen): by price week, then series, then day
+            row, day = np.nonzero(valid)
+            order = np.lexsort((day, row, dayWeek[day]))
+            row, day = row[order], day[order]
+            rank = np.empty(valid.shape, dtype = np.int64)
+            rank[valid] = np.arange(len(values))
+            rank = rank[row, day]
+
+            # Test dataset -> Last `test_days` days
+            cutoff = dates[day].max() - np.timedelta64(self.params['test_days'], 'D')
+            test = dates[day] >= cutoff
+
+            # encode categorical features
+            cat_feats = ['item_id', 'dept_id','store_id', 'cat_id', 'state_id'  ]
+            trainSeries = np.unique(row[~test])
+            usedSeries = np.unique(row)
+            X = np.empty((len(row), len(cat_feats) + 2 + len(features)))
+            for j, cf in enumerate(cat_feats):
+                enc = LabelEncoder()
+                labels = df[cf].astype(str).to_numpy()
+                enc.fit(labels[trainSeries])
+                codes = np.zeros(len(df), dtype = np.int64)
+                codes[usedSeries] = enc.transform(labels[usedSeries])
+                X[:, j] = codes[row]
+            X[:, len(cat_feats)] = calendar["wday"].to_numpy()[day]
+            X[:, len(cat_feats) + 1] = dayPrices[row, day]
+            for j, feature in enumerate(features.values()):
+                X[:, len(cat_feats) + 2 + j] = feature[rank]
+
+            y = sales[row, day].astype(np.int64)
+            event.rows = len(row)
+
+        return X[~test], X[test], y[~test], y[test]
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        np.save(os.path.join(self.working_dir, 'm5forecasting.X_train'), X_train)
-        np.save(os.path.join(self.working_dir, 'm5forecasting.X_test'), X_test)
-        np.save(os.path.join(self.working_dir, 'm5forecasting.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'm5forecasting.y_test'), y_test)
-
-    def read_cache_data(self):
-        X_train = np.load(os.path.join(self.working_dir, 'm5forecasting.X_train.npy'))
-        X_test = np.load(os.path.join(self.working_dir, 'm5forecasting.X_test.npy'))
-        y_train = np.load(os.path.join(self.working_dir, 'm5forecasting.y_train.npy'))
-        y_test = np.load(os.path.join(self.working_dir, 'm5forecasting.y_test.npy'))
+        self._save_array('m5forecasting.X_train', X_train)
+        self._save_array('m5forecasting.X_test', X_test)
+        self._save_array('m5forecasting.y_train', y_train)
+        self._save_array('m5forecasting.y_test', y_test)
+
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('m5forecasting.X_train', mmap)
+        X_test = self._load_array('m5forecasting.X_test', mmap)
+        y_train = self._load_array('m5forecasting.y_train', mmap)
+        y_test = self._load_array('m5forecasting.y_test', mmap)
         return X_train, X_test, y_train, y_test
-
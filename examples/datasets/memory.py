@@ -0,0 +1,121 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def rss():
+    # resident set size of this process in bytes
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # the peak rather than the current size; kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _reset_peak_rss():
+    # resets VmHWM (Linux >= 4.0); returns whether the kernel's peak can be used afterwards
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+class MemoryMonitor():
+    """
+    Context manager that samples the RSS of the process in a background thread every `interval`
+    seconds and, with `trace=True`, traces the Python allocations with `tracemalloc`.
+
+    On Linux the kernel's peak RSS is reset on entry, so that short spikes between two samples
+    are not missed. Monitors should not be nested, as the inner one resets that peak too.
+    Memory allocated by native libraries is only seen by the RSS, not by `tracemalloc`.
+    """
+
+    def __init__(self, interval=0.01, trace=False):
+        self.interval = interval
+        self.trace = trace
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracing = False
+        self.rss_start = self.rss_end = self.rss_peak = None
+        self.traced_start = self.traced_end = self.traced_peak = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.rss_peak = max(self.rss_peak, rss())
+
+    def __enter__(self):
+        if self.trace:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+        self._kernel_peak = _reset_peak_rss()
+        self.rss_start = self.rss_peak = rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='memory-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.rss_end = rss()
+        self.rss_peak = max(self.rss_peak, self.rss_end)
+        if self._kernel_peak:
+            self.rss_peak = max(self.rss_peak, _peak_rss())
+        if self.trace:
+            self.traced_end, self.traced_peak = tracemalloc.get_traced_memory()
+            if self._started_tracing:
+                tracemalloc.stop()
+        return False
+
+    def summary(self, prefix='mem_'):
+        """
+        Peak and delta (end - start) of the RSS and, if traced, of the Python heap, in bytes. The
+        `peak_increase` values are the peaks relative to the start of the monitored region.
+        """
+
+        result = {
+            prefix + 'rss_peak': self.rss_peak,
+            prefix + 'rss_peak_increase': self.rss_peak - self.rss_start,
+            prefix + 'rss_delta': self.rss_end - self.rss_start,
+        }
+        if self.trace:
+            result.update({
+                prefix + 'traced_peak_increase': self.traced_peak - self.traced_start,
+                prefix + 'traced_delta': self.traced_end - self.traced_start,
+            })
+        return result
@@ -13,43 +13,51 @@
 # limitations under the License.
 
 from .dataset import Dataset
+from .ingest import read_svmlight
 import os
-import numpy as np
-from sklearn.datasets import load_svmlight_file
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import normalize
-from scipy.sparse import save_npz, load_npz
-import bz2
 
 class Mnist8m(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['mnist8m.X_train.npz',
-                 'mnist8m.X_test.npz',
-                 'mnist8m.y_train.npy',
-                 'mnist8m.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 48
+
+    IMPORTS = Dataset.IMPORTS + ['sklearn.datasets', 'sklearn.preprocessing']
+
+    def __init__(self, cache_dir, test_size=0.25, random_state=42, norm='l1', **kwargs):
+        files = ['mnist8m.X_train',
+                 'mnist8m.X_test',
+                 'mnist8m.y_train',
+                 'mnist8m.y_test']
+        params = {'test_size': test_size, 'random_state': random_state, 'norm': norm}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_file = os.path.join(self.working_dir, 'mnist8m.scale.bz2')
     
     def download_raw_data(self):
         self._download_file('https://www.csie.ntu.edu.tw/~cjlin/libsvmtools/datasets/multiclass/mnist8m.scale.bz2', self.raw_file)
  
     def preprocess_data(self):
-        X, y = load_svmlight_file(self.raw_file)
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42)
-        X_train = normalize(X_train, axis=1, norm="l1")
-        X_test = normalize(X_test, axis=1, norm="l1")
+        from sklearn.preprocessing import normalize
+        with self._timed('parse') as event:
+            X, y = read_svmlight(self.raw_file)
+            event.bytes, event.rows = self._files_bytes([self.raw_file]), X.shape[0]
+        X_train, X_test, y_train, y_test = self._split(X, y, self.params['test_size'], self.params['random_state'])
+        del X
+        if self.params['norm'] is not None:
+            # in place, on the memory-mapped split
+            with self._timed('normalize') as event:
+                X_train = normalize(X_train, axis=1, norm=self.params['norm'], copy=False)
+                X_test = normalize(X_test, axis=1, norm=self.params['norm'], copy=False)
+                event.rows = X_train.shape[0] + X_test.shape[0]
         return X_train, X_test, y_train, y_test
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        save_npz(os.path.join(self.working_dir, 'mnist8m.X_train'), X_train, compressed=False)
-        save_npz(os.path.join(self.working_dir, 'mnist8m.X_test'), X_test,  compressed=False)
-        np.save(os.path.join(self.working_dir, 'mnist8m.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'mnist8m.y_test'), y_test)
+        self._save_array('mnist8m.X_train', X_train)
+        self._save_array('mnist8m.X_test', X_test)
+        self._save_array('mnist8m.y_train', y_train)
+        self._save_array('mnist8m.y_test', y_test)
 
-    def read_cache_data(self):
-        X_train = load_npz(os.path.join(self.working_dir, 'mnist8m.X_train.npz'))
-        X_test  = load_npz(os.path.join(self.working_dir, 'mnist8m.X_test.npz'))
-        y_train = np.load(os.path.join(self.working_dir, 'mnist8m.y_train.npy'))
-        y_test = np.load(os.path.join(self.working_dir, 'mnist8m.y_test.npy'))
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('mnist8m.X_train', mmap)
+        X_test = self._load_array('mnist8m.X_test', mmap)
+        y_train = self._load_array('mnist8m.y_train', mmap)
+        y_test = self._load_array('mnist8m.y_test', mmap)
         return X_train, X_test, y_train, y_test
@@ -13,42 +13,58 @@
 # limitations under the License.
 
 from .dataset import Dataset
+from .ingest import read_csv, normalize_rows
 import os
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import normalize
 
 class Susy(Dataset):
 
-    def __init__(self, cache_dir):
-        files = ['SUSY.X_train.npy',
-                 'SUSY.X_test.npy',
-                 'SUSY.y_train.npy',
-                 'SUSY.y_test.npy']
-        super().__init__(cache_dir, type(self).__name__, files)
+    PREPARE_MEMORY_GB = 2
+
+    SUPPORTS_RAW_BATCHES = True
+
+    IMPORTS = Dataset.IMPORTS + ['pandas']
+
+    def __init__(self, cache_dir, test_size=0.25, random_state=42, norm='l1', **kwargs):
+        files = ['SUSY.X_train',
+                 'SUSY.X_test',
+                 'SUSY.y_train',
+                 'SUSY.y_test']
+        params = {'test_size': test_size, 'random_state': random_state, 'norm': norm}
+        super().__init__(cache_dir, type(self).__name__, files, params, **kwargs)
         self.raw_file = os.path.join(self.working_dir, 'SUSY.csv.gz')
      
     def download_raw_data(self):
         self._download_file('https://archive.ics.uci.edu/ml/machine-learning-databases/00279/SUSY.csv.gz', self.raw_file)
 
+    def _iter_raw_batches(self, batch_size):
+        import pandas as pd
+        with pd.read_csv(self.raw_file, compression='gzip', header=None, dtype=np.float32, chunksize=batch_size) as reader:
+            for chunk in reader:
+                y = chunk.pop(0).values
+                X = chunk.values
+                # the row normalization only depends on the row itself, so it can be applied per batch
+                normalize_rows(X, self.params['norm'])
+                yield X, y
+
     def preprocess_data(self):
-        df = pd.read_csv(self.raw_file, compression='gzip', header=None)
-        y = df.pop(0).values
-        X = df.values
-        X = normalize(X, axis=1, norm='l1')
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42)
-        return X_train, X_test, y_train, y_test
+        # parse into a scratch memory map and gather the split rows from it block by block,
+        # so that neither the full matrix nor its split copies have to fit into memory
+        X = self._allocate_array('SUSY.X', (5_000_000, 18), np.float32, scratch=True)
+        with self._timed('parse') as event:
+            X, y = read_csv(self.raw_file, label_col=0, norm=self.params['norm'], out=X)
+            event.bytes, event.rows = self._files_bytes([self.raw_file]), X.shape[0]
+        return self._split(X, y, self.params['test_size'], self.params['random_state'])
 
     def write_cache_data(self, X_train, X_test, y_train, y_test):
-        np.save(os.path.join(self.working_dir, 'SUSY.X_train'), X_train)
-        np.save(os.path.join(self.working_dir, 'SUSY.X_test'), X_test)
-        np.save(os.path.join(self.working_dir, 'SUSY.y_train'), y_train)
-        np.save(os.path.join(self.working_dir, 'SUSY.y_test'), y_test)
-
-    def read_cache_data(self):
-        X_train = np.load(os.path.join(self.working_dir, 'SUSY.X_train.npy'))
-        X_test = np.load(os.path.join(self.working_dir, 'SUSY.X_test.npy'))
-        y_train = np.load(os.path.join(self.working_dir, 'SUSY.y_train.npy'))
-        y_test = np.load(os.path.join(self.working_dir, 'SUSY.y_test.npy'))
+        self._save_array('SUSY.X_train', X_train)
+        self._save_array('SUSY.X_test', X_test)
+        self._save_array('SUSY.y_train', y_train)
+        self._save_array('SUSY.y_test', y_test)
+
+    def read_cache_data(self, mmap=False):
+        X_train = self._load_array('SUSY.X_train', mmap)
+        X_test = self._load_array('SUSY.X_test', mmap)
+        y_train = self._load_array('SUSY.y_train', mmap)
+        y_test = self._load_array('SUSY.y_test', mmap)
         return X_train, X_test, y_train, y_test
@@ -0,0 +1,350 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .dataset import Dataset
+from .ingest import normalize_rows
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse import csr_matrix
+
+class SyntheticDataset(Dataset):
+    """
+    Offline stand-in for a real dataset: random data of the same shape (at `scale` times its
+    number of rows), dtype, sparsity and class balance, generated without any download.
+
+    Rows are generated in chunks of about `CHUNK_BYTES` by `n_jobs` threads straight into the
+    cache entry. Every chunk has its own random stream (derived from `random_state`), so that the
+    data does not depend on `n_jobs`. Labels depend on the features, so that models can learn.
+
+    Subclasses implement `generate_chunk(rng, n_rows)`, returning (X, y) of `n_rows` rows drawn
+    from `rng`; X is a dense array, or a CSR matrix with sorted indices if `is_sparse()`.
+    """
+
+    # number of training and test rows, and features, of the real dataset
+    N_TRAIN = 0
+    N_TEST = 0
+    N_FEATURES = 0
+
+    # fraction of positive examples of binary datasets
+    POSITIVE_RATE = 0.5
+
+    # size of the dense float32 rows a chunk is generated from; chunks are sized by bytes, so
+    # that wide datasets do not need more memory per thread than narrow ones
+    CHUNK_BYTES = 16 * 1024 * 1024
+
+    # peak memory of generating a chunk, relative to CHUNK_BYTES (at most 3.3 measured), and of
+    # the interpreter and the libraries it uses
+    CHUNK_MEMORY_FACTOR = 4
+    BASE_MEMORY_GB = 0.25
+
+    # version of the generators, part of the cache key, as the data changes with them
+    GENERATOR = 2
+
+    IMPORTS = []
+
+    def __init__(self, cache_dir, scale=1.0, random_state=42, n_jobs=None, params=None, **kwargs):
+        name = type(self).__name__
+        files = ['%s.X_train' % (name), '%s.X_test' % (name), '%s.y_train' % (name), '%s.y_test' % (name)]
+        params = dict(params or {}, scale=scale, random_state=random_state, generator=self.GENERATOR)
+        super().__init__(cache_dir, name, files, params, **kwargs)
+        self.n_jobs = n_jobs or os.cpu_count()
+
+    @classmethod
+    def prepare_memory_gb(cls, scale=1.0, n_jobs=None, dtype=np.float32, **kwargs):
+        # the chunks being generated by every thread, plus the written pages of the memory-mapped
+        # output and the labels, which are part of the RSS until they are flushed
+        working = cls.CHUNK_MEMORY_FACTOR * cls.CHUNK_BYTES * (n_jobs or os.cpu_count())
+        n_rows = (cls.N_TRAIN + cls.N_TEST) * scale
+        output = n_rows * (cls.output_row_bytes(np.dtype(dtype or np.float32).itemsize, **kwargs) + 8)
+        return cls.BASE_MEMORY_GB + (working + output) / 1024**3
+
+    @classmethod
+    def output_row_bytes(cls, itemsize, **kwargs):
+        # bytes per row of the generated features
+        return cls.N_FEATURES * itemsize
+
+    def row_bytes(self):
+        # bytes per row of the dense float32 arrays that a chunk is generated from
+        return self.N_FEATURES * 4
+
+    def chunk_rows(self):
+        return max(1, self.CHUNK_BYTES // self.row_bytes())
+
+    def raw_files(self):
+        return []
+
+    def n_rows(self):
+        scale = self.params['scale']
+        return max(1, int(round(self.N_TRAIN * scale))), max(1, int(round(self.N_TEST * scale)))
+
+    def feature_dtype(self):
+        return self.dtype or np.dtype(np.float32)
+
+    def is_sparse(self):
+        return False
+
+    def _chunk(self, part, i, n_rows):
+        rng = np.random.default_rng([self.params['random_state'], part, i])
+        return self.generate_chunk(rng, n_rows)
+
+    def _generate(self, name, part, n_rows):
+        chunk_rows = self.chunk_rows()
+        chunks = [(i, start, min(start + chunk_rows, n_rows)) for i, start in enumerate(range(0, n_rows, chunk_rows))]
+        y = np.empty(n_rows, dtype=np.float64)
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+            if not self.is_sparse():
+                X = self._allocate_array(name, (n_rows, self.N_FEATURES), self.feature_dtype())
+                def fill(chunk):
+                    i, start, stop = chunk
+                    X[start:stop], y[start:stop] = self._chunk(part, i, stop - start)
+                list(pool.map(fill, chunks))
+                return X, y
+
+            # sparse: a first pass counts the non-zeros of every chunk, the second one
+            # generates the chunks again and writes them at their offsets
+            nnz = list(pool.map(lambda chunk: self._chunk(part, chunk[0], chunk[2] - chunk[1])[0].nnz, chunks))
+            offsets = np.concatenate([[0], np.cumsum(nnz)])
+            index_dtype = np.int32 if max(offsets[-1], self.N_FEATURES) < np.iinfo(np.int32).max else np.int64
+            indptr = self._allocate_array(name + '.indptr', (n_rows + 1,), index_dtype)
+            indices = self._allocate_array(name + '.indices', (offsets[-1],), index_dtype)
+            data = self._allocate_array(name + '.data', (offsets[-1],), self.feature_dtype())
+            indptr[0] = 0
+            def fill(chunk):
+                i, start, stop = chunk
+                X, y[start:stop] = self._chunk(part, i, stop - start)
+                data[offsets[i]:offsets[i+1]] = X.data
+                indices[offsets[i]:offsets[i+1]] = X.indices
+                indptr[start+1:stop+1] = X.indptr[1:] + offsets[i]
+            list(pool.map(fill, chunks))
+
+        X = csr_matrix((n_rows, self.N_FEATURES), dtype=data.dtype)
+        X.data, X.indices, X.indptr = data, indices, indptr
+        return X, y
+
+    def preprocess_data(self):
+        n_train, n_test = self.n_rows()
+        with self._timed('generate') as event:
+            X_train, y_train = self._generate(self.files[0], 0, n_train)
+            X_test, y_test = self._generate(self.files[1], 1, n_test)
+            event.rows = n_train + n_test
+        return X_train, X_test, y_train, y_test
+
+    def write_cache_data(self, X_train, X_test, y_train, y_test):
+        self._save_array(self.files[0], X_train)
+        self._save_array(self.files[1], X_test)
+        self._save_array(self.files[2], y_train)
+        self._save_array(self.files[3], y_test)
+
+    def read_cache_data(self, mmap=False):
+        return tuple(self._load_array(name, mmap) for name in self.files)
+
+    def _binary_labels(self, rng, n_rows):
+        return (rng.random(n_rows) < self.POSITIVE_RATE).astype(np.float64)
+
+    def _direction(self, n_features, size=1.0):
+        # a fixed direction in feature space (the same for all chunks) along which the classes differ
+        w = np.random.default_rng([self.params['random_state'], 2]).standard_normal(n_features)
+        return (size * w / np.linalg.norm(w)).astype(np.float32)
+
+class _DenseGaussian(SyntheticDataset):
+    # two Gaussian classes with unit covariance, whose means are `SEPARATION` apart
+
+    SEPARATION = 1.5
+    NORM = 'l1'
+
+    def generate_chunk(self, rng, n_rows):
+        y = self._binary_labels(rng, n_rows)
+        X = rng.standard_normal((n_rows, self.N_FEATURES), dtype=np.float32)
+        # shift the positive rows in place, without a temporary of the size of X
+        np.add(X, self._direction(self.N_FEATURES, self.SEPARATION), out=X, where=y[:, None] > 0)
+        if self.NORM == 'l2':
+            X /= np.maximum(np.sqrt(np.einsum('ij,ij->i', X, X)), 1e-12)[:, None]
+        else:
+            normalize_rows(X, self.NORM)
+        return X.astype(self.feature_dtype(), copy=False), y
+
+class SyntheticHiggs(_DenseGaussian):
+    N_TRAIN, N_TEST, N_FEATURES = 8_250_000, 2_750_000, 28
+    POSITIVE_RATE = 0.53
+
+class SyntheticSusy(_DenseGaussian):
+    N_TRAIN, N_TEST, N_FEATURES = 3_750_000, 1_250_000, 18
+    POSITIVE_RATE = 0.458
+
+class SyntheticEpsilon(_DenseGaussian):
+    N_TRAIN, N_TEST, N_FEATURES = 300_000, 100_000, 2000
+    POSITIVE_RATE = 0.5
+    # the raw rows have unit L2 norm
+    NORM = 'l2'
+
+class SyntheticCreditCardFraud(_DenseGaussian):
+    N_TRAIN, N_TEST, N_FEATURES = 213_605, 71_202, 28
+    POSITIVE_RATE = 0.00173
+    SEPARATION = 3.0
+
+class SyntheticMnist8m(SyntheticDataset):
+    """
+    10 balanced classes of 28x28 sparse "images": every class has its own probability of each
+    pixel being set, with about 19% of the pixels set on average.
+    """
+
+    IMPORTS = ['sklearn.preprocessing']
+
+    N_TRAIN, N_TEST, N_FEATURES = 6_075_000, 2_025_000, 784
+    N_CLASSES = 10
+    DENSITY = 0.19
+
+    @classmethod
+    def output_row_bytes(cls, itemsize, **kwargs):
+        return cls.DENSITY * cls.N_FEATURES * (itemsize + 4)
+
+    def is_sparse(self):
+        return True
+
+    def generate_chunk(self, rng, n_rows):
+        from sklearn.preprocessing import normalize
+        prototypes = np.random.default_rng([self.params['random_state'], 3]).beta(0.5, 0.5 / self.DENSITY - 0.5, (self.N_CLASSES, self.N_FEATURES))
+        prototypes = prototypes.astype(np.float32)
+        y = rng.integers(0, self.N_CLASSES, n_rows)
+        # a pixel is set where its uniform draw is below the probability of the row's class;
+        # compared class by class, so that no per-row copy of the probabilities is needed
+        u = rng.random((n_rows, self.N_FEATURES), dtype=np.float32)
+        for c in range(self.N_CLASSES):
+            u[y == c] -= prototypes[c]
+        rows, cols = np.nonzero(u < 0)
+        del u
+        values = rng.random(len(rows), dtype=np.float32) + np.float32(1e-3)
+        X = csr_matrix((values, cols, np.searchsorted(rows, np.arange(n_rows + 1))), shape=(n_rows, self.N_FEATURES))
+        X = normalize(X, norm='l1', copy=False)
+        return X.astype(self.feature_dtype(), copy=False), y.astype(np.float64)
+
+def _field_sizes(n_features, n_fields, seed):
+    # split n_features columns into the one-hot blocks of n_fields categorical fields of very different sizes,
+    # with at least 2 categories each
+    if n_features < 2 * n_fields:
+        raise ValueError("n_features must be at least %d (2 per field), got %d" % (2 * n_fields, n_features))
+    weights = np.random.default_rng(seed).pareto(1.0, n_fields) + 1.0
+    sizes = 2 + (weights / weights.sum() * (n_features - 2 * n_fields)).astype(np.int64)
+    sizes[np.argmax(sizes)] += n_features - sizes.sum()
+    return sizes
+
+class SyntheticAvazu(SyntheticDataset):
+    """
+    Click-through data: every row is the one-hot encoding of `N_FIELDS` categorical fields over
+    `n_features` columns, with Zipf-distributed categories that are shifted for clicks.
+    """
+
+    N_TRAIN, N_TEST, N_FEATURES = 12_642_186, 1_953_951, 1_000_000
+    N_FIELDS = 15
+    POSITIVE_RATE = 0.17
+
+    def __init__(self, cache_dir, n_features=1_000_000, **kwargs):
+        super().__init__(cache_dir, params={'n_features': n_features}, **kwargs)
+        self.N_FEATURES = n_features
+        self.sizes = _field_sizes(n_features, self.N_FIELDS, [self.params['random_state'], 4])
+
+    @classmethod
+    def output_row_bytes(cls, itemsize, **kwargs):
+        return cls.N_FIELDS * (itemsize + 4)
+
+    def row_bytes(self):
+        # a chunk is generated as a few int64 arrays of N_FIELDS columns
+        return self.N_FIELDS * 8
+
+    def is_sparse(self):
+        return True
+
+    def generate_chunk(self, rng, n_rows):
+        y = self._binary_labels(rng, n_rows)
+        offsets = np.concatenate([[0], np.cumsum(self.sizes)[:-1]])
+        ranks = np.minimum(rng.zipf(1.5, (n_rows, self.N_FIELDS)) - 1, 1 << 40)
+        # clicks favour other categories in every second field
+        np.add(ranks, np.arange(self.N_FIELDS) % 2, out=ranks, where=y[:, None] > 0)
+        cols = offsets + ranks % self.sizes
+        X = csr_matrix((np.ones(cols.size, dtype=self.feature_dtype()), cols.ravel(), np.arange(0, cols.size + 1, self.N_FIELDS)),
+                       shape=(n_rows, self.N_FEATURES))
+        return X, y
+
+class SyntheticAllstate(SyntheticDataset):
+    """
+    Insurance claims: a block of min-max scaled numeric columns and the one-hot encoding of 12
+    categorical columns, L1-normalized, as dense rows or (with `sparse`) CSR rows.
+    """
+
+    IMPORTS = ['sklearn.preprocessing']
+
+    N_TRAIN, N_TEST = 9_228_003, 3_954_287
+    N_NUMERIC = 22
+    CATEGORIES = [11, 4, 7, 4, 4, 6, 5, 4, 2, 4, 7, 7]
+    N_FEATURES = N_NUMERIC + sum(CATEGORIES)
+    POSITIVE_RATE = 0.0073
+
+    def __init__(self, cache_dir, sparse=False, **kwargs):
+        super().__init__(cache_dir, params={'sparse': sparse}, **kwargs)
+
+    @classmethod
+    def output_row_bytes(cls, itemsize, sparse=False, **kwargs):
+        return (cls.N_NUMERIC + len(cls.CATEGORIES)) * (itemsize + 4) if sparse else cls.N_FEATURES * itemsize
+
+    def is_sparse(self):
+        return self.params['sparse']
+
+    def generate_chunk(self, rng, n_rows):
+        from sklearn.preprocessing import normalize
+        y = self._binary_labels(rng, n_rows)
+        numeric = rng.random((n_rows, self.N_NUMERIC), dtype=np.float32)
+        np.add(numeric, np.abs(self._direction(self.N_NUMERIC, 0.5)), out=numeric, where=y[:, None] > 0)
+        np.clip(numeric, 0.0, 1.0, out=numeric)
+        sizes = np.array(self.CATEGORIES)
+        codes = (rng.random((n_rows, len(sizes))) ** (1.0 + y[:, None]) * sizes).astype(np.int64)
+        cols = np.concatenate([[self.N_NUMERIC], self.N_NUMERIC + np.cumsum(sizes)[:-1]]) + codes
+        if self.params['sparse']:
+            width = self.N_NUMERIC + len(sizes)
+            indices = np.concatenate([np.broadcast_to(np.arange(self.N_NUMERIC), (n_rows, self.N_NUMERIC)), cols], axis=1)
+            values = np.concatenate([numeric, np.ones(cols.shape, dtype=np.float32)], axis=1)
+            X = csr_matrix((values.ravel(), indices.ravel(), np.arange(0, n_rows * width + 1, width)), shape=(n_rows, self.N_FEATURES))
+            X.eliminate_zeros()
+            X = normalize(X, norm='l1', copy=False)
+            return X.astype(self.feature_dtype(), copy=False), y
+        X = np.zeros((n_rows, self.N_FEATURES), dtype=np.float32)
+        X[:, :self.N_NUMERIC] = numeric
+        X[np.arange(n_rows)[:, None], cols] = 1.0
+        normalize_rows(X, 'l1')
+        return X.astype(self.feature_dtype(), copy=False), y
+
+class SyntheticM5Forecasting(SyntheticDataset):
+    """
+    Daily unit sales: Poisson counts with a Gamma-distributed rate per row, and the features of the
+    M5 notebook (categorical codes, week day, price, lags and rolling means of earlier sales).
+    """
+
+    N_TRAIN, N_TEST, N_FEATURES = 10_275_130, 853_720, 13
+    CATEGORIES = [3049, 7, 10, 3, 3]
+
+    def generate_chunk(self, rng, n_rows):
+        rate = rng.gamma(0.3, 1.1 / 0.3, n_rows)
+        X = np.empty((n_rows, self.N_FEATURES), dtype=np.float64)
+        for j, n in enumerate(self.CATEGORIES):
+            X[:, j] = rng.integers(0, n, n_rows)
+        X[:, 5] = rng.integers(1, 8, n_rows)
+        X[:, 6] = np.round(rng.lognormal(1.2, 0.8, n_rows), 2)
+        # lag_7, lag_28, and the rolling means over 7 and 28 days of both
+        X[:, 7] = rng.poisson(rate)
+        X[:, 8] = rng.poisson(rate)
+        for j, window in enumerate([7, 28, 7, 28]):
+            X[:, 9 + j] = rng.poisson(rate * window) / window
+        y = rng.poisson(rate).astype(np.float64)
+        return X.astype(self.feature_dtype(), copy=False), y
@@ -0,0 +1,77 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run from the examples directory with `python -m unittest datasets.test_dataset`.
+
+import os
+import tempfile
+import unittest
+import contextlib
+import numpy as np
+from scipy.sparse import issparse
+
+from datasets import SyntheticHiggs, SyntheticAllstate
+
+class CacheIsolationTest(unittest.TestCase):
+    """
+    The arrays returned by `get_train_test_split` right after building the cache must not be
+    the memory maps the cache was built in.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def split(self, cls, mmap=False, **kwargs):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            return cls(self.dir.name, scale=1e-4, **kwargs).get_train_test_split(mmap=mmap)
+
+    def assertIsolated(self, cls, **kwargs):
+        X_train, X_test, y_train, y_test = self.split(cls, **kwargs)
+        values = X_train.data if issparse(X_train) else X_train
+        self.assertNotIsInstance(values, np.memmap)
+        expected = values[0].copy()
+        values[0] = 12345.0
+        y_train[0] = 12345.0
+        X_again, _, y_again, _ = self.split(cls, **kwargs)
+        again = X_again.data if issparse(X_again) else X_again
+        np.testing.assert_array_equal(again[0], expected)
+        self.assertNotEqual(y_again[0], 12345.0)
+
+    def assertNoLeftovers(self):
+        for root, dirs, files in os.walk(self.dir.name):
+            self.assertFalse([d for d in dirs if '.tmp-' in d])
+            self.assertFalse([f for f in files if f.endswith('.scratch.npy')])
+
+    def test_npy(self):
+        self.assertIsolated(SyntheticHiggs)
+        self.assertNoLeftovers()
+
+    def test_blocked(self):
+        self.assertIsolated(SyntheticHiggs, cache_format='blocked')
+        self.assertNoLeftovers()
+
+    def test_sparse(self):
+        self.assertIsolated(SyntheticAllstate, sparse=True)
+        self.assertNoLeftovers()
+
+    def test_mmap_is_read_only(self):
+        X_train = self.split(SyntheticHiggs, mmap=True)[0]
+        with self.assertRaises(ValueError):
+            X_train[0, 0] = 12345.0
+
+if __name__ == '__main__':
+    unittest.main()
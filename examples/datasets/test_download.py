@@ -0,0 +1,132 @@
+# Copyright 2021 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run from the examples directory with `python -m unittest datasets.test_download`.
+
+import os
+import re
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from datasets.download import download_file
+
+SEGMENT_SIZE = 64 * 1024
+PAYLOAD = os.urandom(10 * SEGMENT_SIZE + 123)
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves PAYLOAD with range requests as configured on the server: `ranges` (honour Range
+    headers), `unknown_length` (answer them with 'bytes a-b/*' and send no Content-Length on
+    HEAD) and `fail` (starts of ranges to answer with an error once).
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        if not self.server.unknown_length:
+            self.send_header('Content-Length', str(len(PAYLOAD)))
+        if self.server.ranges and not self.server.unknown_length:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if not self.server.ranges or match is None:
+            self.server.requests.append(None)
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+            return
+        start, end = int(match.group(1)), min(int(match.group(2)), len(PAYLOAD) - 1)
+        self.server.requests.append(start)
+        if start in self.server.fail:
+            self.server.fail.discard(start)
+            self.send_error(503)
+            return
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes %d-%d/%s' % (start, end, '*' if self.server.unknown_length else len(PAYLOAD)))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[start:end+1])
+
+class _Server(ThreadingHTTPServer):
+
+    def handle_error(self, request, client_address):
+        # clients close the connection after the headers of probe requests
+        pass
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _RangeHandler)
+        self.server.ranges, self.server.unknown_length, self.server.fail, self.server.requests = True, False, set(), []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/data.bin' % (self.server.server_address[1])
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'data.bin')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def download(self):
+        download_file(self.url, self.filename, n_connections=4, segment_size=SEGMENT_SIZE,
+                      sha256=hashlib.sha256(PAYLOAD).hexdigest())
+
+    def assertDownloaded(self):
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+        self.assertFalse(os.path.exists(self.filename + '.part.json'))
+
+    def test_segments(self):
+        self.download()
+        self.assertDownloaded()
+        self.assertEqual(sorted(self.server.requests), list(range(0, len(PAYLOAD), SEGMENT_SIZE)))
+
+    def test_resume(self):
+        failed = {3 * SEGMENT_SIZE, 7 * SEGMENT_SIZE}
+        self.server.fail = set(failed)
+        with self.assertRaises(Exception):
+            self.download()
+        self.assertTrue(os.path.exists(self.filename + '.part.json'))
+        self.server.requests = []
+        self.download()
+        self.assertDownloaded()
+        # only the segments that had not been completed are fetched again
+        self.assertEqual(sorted(self.server.requests), sorted(failed))
+
+    def test_unknown_length(self):
+        # 'Content-Range: bytes 0-0/*' falls back to a single stream
+        self.server.unknown_length = True
+        self.download()
+        self.assertDownloaded()
+        self.assertIn(None, self.server.requests)
+
+    def test_no_ranges(self):
+        self.server.ranges = False
+        self.download()
+        self.assertDownloaded()
+        self.assertEqual(set(self.server.requests), {None})
+
+if __name__ == '__main__':
+    unittest.main()
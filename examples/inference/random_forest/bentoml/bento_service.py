@@ -5,6 +5,14 @@ from bentoml import env, artifacts, api, BentoService
 from bentoml.adapters import DataframeInput
 from bentoml.frameworks.sklearn import SklearnModelArtifact
 
+# Micro-batching: the BentoML marshal server coalesces concurrent requests into batches of at
+# most MAX_BATCH_SIZE rows, scores each batch with one call of `predict` and scatters the
+# results back to the requests. It waits for more requests only as long as the measured
+# predict time allows, and rejects requests (HTTP 503) rather than exceed MAX_LATENCY_MS.
+# The Snap ML prediction engine accepts batches of fewer than 32768 rows.
+MAX_BATCH_SIZE = 1000
+MAX_LATENCY_MS = 50
+
 @env(infer_pip_packages=True)
 @artifacts([SklearnModelArtifact('model')])
 class BreastCancerClassifier(BentoService):
@@ -12,11 +20,12 @@ class BreastCancerClassifier(BentoService):
     A minimum prediction service exposing a Snap ML model
     """
 
-    @api(input=DataframeInput(), batch=True)
+    @api(input=DataframeInput(), batch=True, mb_max_batch_size=MAX_BATCH_SIZE, mb_max_latency=MAX_LATENCY_MS)
     def predict(self, df):
         """
         An inference API named `predict` with Dataframe input adapter, which codifies
         how HTTP requests or CSV files are converted to a pandas Dataframe object as the
-        inference API function input
+        inference API function input. With `batch=True`, `df` holds the rows of all the
+        requests of a micro-batch, and one prediction is returned per row.
         """
         return self.artifacts.model.predict(df.values)
@@ -2,6 +2,7 @@ import requests
 import numpy as np
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from sklearn import datasets
 
 # X, y = datasets.load_breast_cancer(return_X_y=True)
@@ -12,6 +13,47 @@ data = [[1.799e+01, 1.038e+01, 1.228e+02, 1.001e+03, 1.184e-01, 2.776e-01,
         3.003e-02, 6.193e-03, 2.538e+01, 1.733e+01, 1.846e+02, 2.019e+03,
         1.622e-01, 6.656e-01, 7.119e-01, 2.654e-01, 4.601e-01, 1.189e-01]]
 
-response = requests.post("http://0.0.0.0:5000/predict", json=data)
-print(response.text)
+parser = argparse.ArgumentParser(description='Send single-row requests to the BentoML service')
+parser.add_argument('--url', default='http://0.0.0.0:5000/predict', help='prediction endpoint (default: %(default)s)')
+parser.add_argument('--requests', type=int, default=1, help='number of requests (default: %(default)s)')
+parser.add_argument('--concurrency', type=int, default=1, help='number of concurrent clients (default: %(default)s)')
+parser.add_argument('--max-p99', type=float, default=None, help='exit with 1 if the p99 latency exceeds this many milliseconds')
+args = parser.parse_args()
 
+if args.requests == 1:
+    response = requests.post(args.url, json=data)
+    print(response.text)
+    raise SystemExit(0)
+
+X, _ = datasets.load_breast_cancer(return_X_y=True)
+
+def send(i):
+    # one row per request, as online traffic arrives
+    t0 = time.perf_counter()
+    try:
+        status = requests.post(args.url, json=X[i % X.shape[0]:i % X.shape[0] + 1].tolist()).status_code
+    except requests.RequestException:
+        status = None
+    return time.perf_counter() - t0, status
+
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+    results = list(pool.map(send, range(args.requests)))
+elapsed = time.perf_counter() - start
+
+latencies = np.array([t for t, status in results if status == 200]) * 1000
+failed = len(results) - len(latencies)
+print("%d requests from %d clients in %.2f s: %.1f requests/s, %d failed or rejected" %
+      (args.requests, args.concurrency, elapsed, len(latencies) / elapsed, failed))
+if not len(latencies):
+    print("All requests failed")
+    raise SystemExit(1)
+p50, p99 = np.percentile(latencies, [50, 99])
+print("latency: p50 %.1f ms, p99 %.1f ms, max %.1f ms" % (p50, p99, latencies.max()))
+# requests rejected for exceeding the latency bound count as failures, not just as missing samples
+if failed:
+    print("%d requests failed or were rejected" % (failed))
+    raise SystemExit(1)
+if args.max_p99 is not None and p99 > args.max_p99:
+    print("p99 latency over %.1f ms" % (args.max_p99))
+    raise SystemExit(1)
@@ -12,4 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from utils.system_utils import get_environment
\ No newline at end of file
+import importlib
+
+# imported on first access, as `utils.system_utils` needs psutil
+_ATTRIBUTES = {'get_environment': 'utils.system_utils'}
+
+__all__ = list(_ATTRIBUTES)
+
+def __getattr__(name):
+    if name not in _ATTRIBUTES:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -14,22 +14,163 @@
 
 import platform
 import os
+import re
+import sys
+import glob
 import psutil
-import json
-import snapml
-import sklearn
-import xgboost
-import lightgbm
+from functools import lru_cache
+from importlib import metadata
 
-def get_environment():
-    return {
+# distributions whose versions are recorded, by the key prefix used for them
+PACKAGES = {
+    'snapml': 'snapml',
+    'sklearn': 'scikit-learn',
+    'xgboost': 'xgboost',
+    'lightgbm': 'lightgbm',
+    'numpy': 'numpy',
+    'scipy': 'scipy',
+}
+
+# environment variables that set the size or placement of thread pools
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OMP_PROC_BIND', 'OMP_PLACES', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'BLIS_NUM_THREADS']
+
+# instruction set tags in the names of the native Snap ML libraries
+ISA_TAGS = ['avx512', 'avx2', 'avx', 'sse4', 'zdnn', 'z15', 'z16', 'power9', 'power10', 'vsx', 'cuda', 'gpu', 'mpi']
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def _version(distribution):
+    # the installed version, without importing the package
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return None
+
+def _ranges(cpus):
+    # compact list of CPU ids, e.g. '0-3,8-11'
+    cpus, ranges = sorted(cpus), []
+    for cpu in cpus:
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join('%d-%d' % (a, b) if a != b else '%d' % (a) for a, b in ranges)
+
+def _ranges_to_list(text):
+    cpus = []
+    for part in text.split(','):
+        a, _, b = part.partition('-')
+        cpus.extend(range(int(a), int(b or a) + 1))
+    return cpus
+
+def _cpu_model():
+    for line in (_read('/proc/cpuinfo') or '').splitlines():
+        if line.split(':')[0].strip() in ['model name', 'cpu', 'machine']:
+            return line.split(':', 1)[1].strip()
+    return platform.processor() or None
+
+def _caches():
+    # size of the L2 and L3 (unified or data) caches of cpu0
+    caches = {}
+    for index in glob.glob('/sys/devices/system/cpu/cpu0/cache/index*'):
+        level, kind, size = _read(index + '/level'), _read(index + '/type'), _read(index + '/size')
+        if level in ['2', '3'] and kind in ['Unified', 'Data'] and size:
+            caches['l%s_cache' % (level)] = size
+    return caches
+
+def _smt():
+    active = _read('/sys/devices/system/cpu/smt/active')
+    siblings = _read('/sys/devices/system/cpu/cpu0/topology/thread_siblings_list')
+    threads = len(_ranges_to_list(siblings)) if siblings else None
+    return {'smt_active': None if active is None else active == '1', 'threads_per_core': threads}
+
+def _numa_nodes():
+    nodes = glob.glob('/sys/devices/system/node/node[0-9]*')
+    return len(nodes) or None
+
+def _governor():
+    governors = {_read(path) for path in glob.glob('/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_governor')}
+    governors.discard(None)
+    return ','.join(sorted(governors)) or None
+
+def _snapml_variant():
+    """
+    Instruction set tags of the native Snap ML libraries: of those loaded into this process if
+    snapml has been imported, and otherwise of those installed.
+    """
+
+    try:
+        files = [str(f) for f in metadata.files('snapml') or [] if '.so' in str(f) or str(f).endswith('.pyd')]
+    except metadata.PackageNotFoundError:
+        return None
+    loaded = set()
+    if 'snapml' in sys.modules:
+        maps = _read('/proc/self/maps') or ''
+        loaded = {os.path.basename(f) for f in files if os.path.basename(f) in maps}
+    names = loaded or {os.path.basename(f) for f in files}
+    tags = sorted({tag for name in names for tag in ISA_TAGS if re.search(r'(^|[^a-z])%s([^a-z0-9]|$)' % (tag), name.lower())})
+    return ','.join(tags) or 'generic'
+
+@lru_cache(maxsize=None)
+def _static_environment():
+    # what does not change while the process runs
+    environment = {
         'platform': platform.platform(),
+        'python_version': platform.python_version(),
+        'cpu_model': _cpu_model(),
         'cpu_count': os.cpu_count(),
-        'cpu_freq_min': psutil.cpu_freq().min,
-        'cpu_freq_max': psutil.cpu_freq().max,
+        'cpu_freq_min': None,
+        'cpu_freq_max': None,
         'total_memory': psutil.virtual_memory().total/1024/1024/1024,
-        'snapml_version': snapml.__version__,
-        'sklearn_version': sklearn.__version__,
-        'xgboost_version': xgboost.__version__,
-        'lightgbm_version': lightgbm.__version__,
-    }
\ No newline at end of file
+        'numa_nodes': _numa_nodes(),
+        'l2_cache': None,
+        'l3_cache': None,
+        'cpu_governor': _governor(),
+    }
+    freq = psutil.cpu_freq()
+    if freq is not None:
+        environment['cpu_freq_min'], environment['cpu_freq_max'] = freq.min, freq.max
+    environment.update(_caches())
+    environment.update(_smt())
+    for key, distribution in PACKAGES.items():
+        environment['%s_version' % (key)] = _version(distribution)
+    environment['snapml_variant'] = _snapml_variant()
+    return environment
+
+def _thread_pools():
+    # the BLAS and OpenMP pools of the libraries loaded so far, e.g. 'blas:openblas 0.3.23 Haswell x8'
+    try:
+        from threadpoolctl import threadpool_info
+    except ImportError:
+        return None
+    # so that the BLAS pool is always reported
+    import numpy
+    pools = []
+    for pool in threadpool_info():
+        pools.append('%s:%s%s%s x%d' % (pool['user_api'], pool['internal_api'],
+                                        ' %s' % (pool['version']) if pool.get('version') else '',
+                                        ' %s' % (pool['architecture']) if pool.get('architecture') else '',
+                                        pool['num_threads']))
+    return '; '.join(pools) or None
+
+def get_environment():
+    """
+    The hardware and software environment, as a flat dict. The hardware and installed versions are
+    determined once per process; the affinity mask and thread pools are read on every call, as
+    they may change. Library versions are read from the package metadata, without importing them.
+    """
+
+    environment = dict(_static_environment())
+    if hasattr(os, 'sched_getaffinity'):
+        affinity = os.sched_getaffinity(0)
+        environment['affinity'] = _ranges(affinity)
+        environment['affinity_count'] = len(affinity)
+    environment['thread_pools'] = _thread_pools()
+    for variable in THREAD_VARIABLES:
+        environment[variable] = os.environ.get(variable)
+    return environment